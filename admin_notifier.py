@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+
+from outbound_limiter import PRIORITY_NORMAL
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_LIMIT = 4096
+
+
+class AdminNotifier:
+    """Admin notifications about user activity, sent off the user's critical path.
+
+    With a digest interval events are counted and sent as one message per
+    interval ("37 started, 22 registered"); with interval 0 every event is
+    sent right away, in the background.
+    """
+
+    def __init__(self, admin_id, interval=None, verbosity=None):
+        self.admin_id = admin_id
+        self.interval = interval if interval is not None else float(os.getenv('ADMIN_DIGEST_INTERVAL', '60'))
+        # 'summary' - counts only, 'full' - counts and the list of registrations
+        self.verbosity = verbosity or os.getenv('ADMIN_DIGEST_VERBOSITY', 'summary')
+        self.bot = None
+        self._loop = None
+        self._started = 0
+        self._registered = []
+        self._task = None
+        self._sending = set()
+
+    def start(self, bot):
+        self.bot = bot
+        self._loop = asyncio.get_running_loop()
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Send what is collected and stop the digest loop"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+    def user_started(self, user):
+        if self.interval > 0:
+            self._started += 1
+            return
+        self._send_later(f"🆕 Новый пользователь начал регистрацию: @{user.username or 'без username'}")
+
+    def user_registered(self, user, wallet, referrer):
+        if self.interval > 0:
+            self._registered.append((user.id, user.username, wallet, referrer))
+            return
+        self._send_later(
+            f"✅ Новая регистрация!\n"
+            f"👤 Пользователь: @{user.username or 'без username'}\n"
+            f"📱 ID: {user.id}\n"
+            f"💼 Кошелек: {wallet}\n"
+            f"👥 Реферер: {referrer}"
+        )
+
+    def alert(self, text):
+        """Send text to the admin right away, may be called from any thread"""
+        if self._loop is None:
+            logger.warning(f"Admin alert before the bot started: {text}")
+            return
+        self._loop.call_soon_threadsafe(self._send_later, text)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self._started and not self._registered:
+            return
+        text = self._digest(self._started, self._registered)
+        self._started = 0
+        self._registered = []
+        await self._send(text)
+
+    def _digest(self, started, registered):
+        text = (
+            f"📊 За последние {self._period()}: "
+            f"начали регистрацию — {started}, зарегистрировались — {len(registered)}"
+        )
+        if self.verbosity != 'full' or not registered:
+            return text
+
+        lines = [text, ""]
+        length = len(text) + 1
+        for shown, (user_id, username, wallet, _) in enumerate(registered):
+            line = f"✅ @{username or 'без username'} ({user_id}) — {wallet}"
+            # Keep room for the "and N more" line
+            if length + len(line) + 1 > MESSAGE_LIMIT - 40:
+                lines.append(f"... и еще {len(registered) - shown}")
+                break
+            lines.append(line)
+            length += len(line) + 1
+        return "\n".join(lines)
+
+    def _period(self):
+        if self.interval >= 60 and self.interval % 60 == 0:
+            return f"{int(self.interval // 60)} мин"
+        return f"{self.interval:g} с"
+
+    def _send_later(self, text):
+        task = asyncio.create_task(self._send(text))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, text):
+        if not self.bot or not self.admin_id:
+            return
+        try:
+            await self.bot.send_message(
+                chat_id=self.admin_id, text=text, rate_limit_args={'priority': PRIORITY_NORMAL}
+            )
+        except Exception as e:
+            logger.error(f"Failed to notify admin: {e}")
@@ -0,0 +1,73 @@
+"""Time the wallet audit on a generated sheet.
+
+Rows get checksummed, lowercase and broken addresses, case-only duplicates
+and self-referrals mixed in. Run twice in one process to see the effect of
+the memoized checksum hashing.
+
+Usage: python benchmarks/bench_audit.py --rows 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wallet_audit
+from sheet_mirror import SHEET_HEADERS
+
+
+def make_rows(count, seed=1):
+    rng = random.Random(seed)
+    values = [SHEET_HEADERS]
+    for i in range(count):
+        wallet = f'0x{rng.getrandbits(160):040x}'
+        referrer = f'0x{rng.getrandbits(160):040x}'
+        kind = rng.random()
+        if kind < 0.6:
+            wallet = wallet_audit.to_checksum_address(wallet) or wallet
+        elif kind < 0.61:
+            wallet = wallet[:-1]  # malformed
+        elif kind < 0.62:
+            # Broken checksum: flip the case of one letter of a checksummed address
+            wallet = wallet_audit.to_checksum_address(wallet) or wallet
+            letter = next((j for j in range(2, 42) if wallet[j].isalpha()), None)
+            if letter:
+                wallet = wallet[:letter] + wallet[letter].swapcase() + wallet[letter + 1:]
+        elif kind < 0.63:
+            referrer = wallet  # self-referral
+        values.append([str(100000 + i), f'user{i}', wallet, referrer, ''])
+    # Case-only duplicates of the first rows
+    for i in range(1, min(count, 100) + 1):
+        row = list(values[i])
+        row[2] = row[2].upper().replace('0X', '0x')
+        values.append(row)
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    assert wallet_audit.has_valid_checksum('0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed') or \
+        wallet_audit.keccak_hex(b'') is None
+
+    for rows in args.rows:
+        values = make_rows(rows)
+        for run in ('cold', 'warm'):
+            if run == 'cold':
+                wallet_audit.to_checksum_address.cache_clear()
+            started = time.perf_counter()
+            report = wallet_audit.audit_rows(values)
+            elapsed = time.perf_counter() - started
+            print(
+                f"{rows:>7} rows {run}: {elapsed:.2f}s  malformed={len(report['malformed'])} "
+                f"bad_checksum={len(report['bad_checksum'])} case_dupes={len(report['case_duplicates'])} "
+                f"self_ref={len(report['self_referrals'])} checksum={'on' if report['checksum_checked'] else 'off'}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Drive simulated users through the registration conversation and report throughput.
+
+Every user sends /start -> language -> Start -> wallet type -> wallet -> referrer.
+All messages are queued at once, interleaved across users, so the run also
+checks that each user's updates stay in order: every user has to end up with
+exactly one saved registration. The sheet write is simulated with a sleep.
+Telegram's send limits are lifted, so the run measures update processing
+and not the outbound rate limiter; --rate-limit keeps them.
+
+Usage: python benchmarks/bench_conversations.py --users 500 --concurrency 1 32
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_telegram import FakeBotApi, FakeServer, make_handler
+
+ADMIN_ID = 1
+
+
+def make_message(update_id, user_id, text):
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}', 'username': f'user{user_id}'},
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+    return {'update_id': update_id, 'message': message}
+
+
+async def run_once(users, concurrency, save_latency):
+    # Imported late: main.py reads its configuration from the environment at import time
+    import main as bot_main
+    from telegram import Update
+    from translations import TRANSLATIONS
+    from update_processor import PerUserUpdateProcessor
+
+    bot = bot_main.WalletBot(bot_main.BOT_TOKEN, ADMIN_ID)
+    saved = {}
+
+    async def save_user_data(user_data):
+        await asyncio.sleep(save_latency)
+        user_id = user_data['Телеграмм ID']
+        saved[user_id] = saved.get(user_id, 0) + 1
+        return True
+
+    bot.excel_service.save_user_data = save_user_data
+    bot_main.PerUserUpdateProcessor = lambda: PerUserUpdateProcessor(concurrency)
+    application = bot.build_application()
+
+    script = ['/start', 'English 🇬🇧', 'Start', TRANSLATIONS['en']['evm_wallet'], None, None]
+    updates = []
+    update_id = 0
+    for step, text in enumerate(script):
+        for i in range(users):
+            user_id = 100000 + i
+            if step == 4:
+                text = f'0x{user_id:040x}'
+            elif step == 5:
+                text = f'0x{user_id + 1:040x}'
+            update_id += 1
+            updates.append(make_message(update_id, user_id, text))
+
+    await application.initialize()
+    await application.start()
+    try:
+        started = time.perf_counter()
+        for data in updates:
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        while len(saved) < users and time.perf_counter() - started < 120:
+            await asyncio.sleep(0.01)
+        # Let the last handlers finish their replies
+        while application.update_queue.qsize():
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+    finally:
+        await application.stop()
+        await application.shutdown()
+        bot.excel_service.close()
+
+    wrong = [user_id for user_id, count in saved.items() if count != 1]
+    return elapsed, len(saved), wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 32])
+    parser.add_argument('--save-latency', type=float, default=0.2, help='simulated sheet write, seconds')
+    parser.add_argument('--api-port', type=int, default=8082)
+    parser.add_argument('--rate-limit', action='store_true',
+                        help="keep Telegram's send limits, replies then go out at 30 messages/s")
+    args = parser.parse_args()
+
+    api = FakeBotApi()
+    server = FakeServer(('127.0.0.1', args.api_port), make_handler(api))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    workdir = tempfile.mkdtemp(prefix='bench_conversations_')
+    os.makedirs(os.path.join(workdir, 'data'))
+    with open(os.path.join(workdir, 'data', 'excel_link.txt'), 'w') as f:
+        f.write('https://docs.google.com/spreadsheets/d/bench/edit')
+    os.chdir(workdir)
+    os.environ.update(
+        BOT_TOKEN='123456:FAKE',
+        ADMIN_ID=str(ADMIN_ID),
+        TELEGRAM_API_URL=f'http://127.0.0.1:{args.api_port}/bot',
+        STORE_FILE=os.path.join(workdir, 'registrations.db'),
+    )
+    if not args.rate_limit:
+        os.environ.update(OUTBOUND_GLOBAL_RATE='100000', OUTBOUND_CHAT_RATE='100000', OUTBOUND_CHAT_BURST='100000')
+
+    steps = 6
+    print(f'{"concurrency":>11} {"users":>6} {"updates/s":>10} {"users/s":>8} {"elapsed":>8}  ordering')
+    try:
+        for concurrency in args.concurrency:
+            elapsed, done, wrong = asyncio.run(run_once(args.users, concurrency, args.save_latency))
+            ordering = 'ok' if done == args.users and not wrong else f'{args.users - done} unfinished, {len(wrong)} duplicated'
+            print(f'{concurrency:>11} {args.users:>6} {args.users * steps / elapsed:>10.1f} '
+                  f'{done / elapsed:>8.1f} {elapsed:>7.2f}s  {ordering}')
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
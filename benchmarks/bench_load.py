@@ -0,0 +1,316 @@
+"""Offline load test: WalletBot against a fake Bot API and a fake gspread backend.
+
+N users run the whole registration flow concurrently, each in a random
+language, sending the next message only after the bot answered the previous
+one. Then the admin validates some of them one by one. Reports throughput,
+p50/p95/p99 latency per step and peak RSS, and saves everything as JSON so
+runs can be compared.
+
+Usage:
+    python benchmarks/bench_load.py --users 200 --validate 50
+    python benchmarks/bench_load.py --users 500 --sheets-latency 0.3 --output results/slow_sheets.json
+    python benchmarks/bench_load.py --users 1000 --no-rate-limit
+    python benchmarks/bench_load.py --sheets-http --sheets-write-quota 60 --sheets-error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_sheets import Conditions, FakeClient, SheetsServer, http_client
+from fake_telegram import FakeBotApi, FakeServer, make_handler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN_ID = 1
+SHEET_ID = 'bench'
+LANGUAGES = {
+    'en': 'English 🇬🇧',
+    'zh': '中文 🇨🇳',
+    'id': 'Indonesia 🇮🇩',
+    'ph': 'Filipino 🇵🇭',
+    'vi': 'Tiếng Việt 🇻🇳',
+    'ru': 'Русский 🇷🇺',
+}
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'p50': percentile(values, 0.50),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+        'max': max(values) if values else 0.0,
+    }
+
+
+def peak_rss_mib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+class Driver:
+    """Sends updates as users and waits for the bot's answers"""
+
+    def __init__(self, application, api, timeout):
+        self.application = application
+        self.timeout = timeout
+        self.loop = asyncio.get_running_loop()
+        self.inboxes = {}
+        self.update_id = 0
+        self.latencies = {}
+        self.errors = []
+        api.listeners.append(self._on_message)
+
+    def _on_message(self, method, params):
+        # Called from the fake API's threads
+        chat_id = int(params.get('chat_id', 0))
+        self.loop.call_soon_threadsafe(self._inbox(chat_id).put_nowait, params.get('text', ''))
+
+    def _inbox(self, chat_id):
+        if chat_id not in self.inboxes:
+            self.inboxes[chat_id] = asyncio.Queue()
+        return self.inboxes[chat_id]
+
+    async def step(self, name, user_id, text, expect=None):
+        """Send text as user_id, wait for a reply (containing expect, if given)"""
+        from telegram import Update
+
+        self.update_id += 1
+        message = {
+            'message_id': self.update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}', 'username': f'user{user_id}'},
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        update = Update.de_json({'update_id': self.update_id, 'message': message}, self.application.bot)
+
+        inbox = self._inbox(user_id)
+        started = time.perf_counter()
+        await self.application.update_queue.put(update)
+        deadline = started + self.timeout
+        while True:
+            try:
+                reply = await asyncio.wait_for(inbox.get(), max(deadline - time.perf_counter(), 0.001))
+            except asyncio.TimeoutError:
+                self.errors.append(f'{name}: no reply for user {user_id}')
+                return None
+            if expect is None or expect in reply:
+                break
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+        return reply
+
+
+async def register(driver, translations, user_id, language, think):
+    wallet = f'0x{user_id:040x}'
+    referrer = f'0x{user_id + 1:040x}'
+    steps = [
+        ('start', '/start'),
+        ('select_language', LANGUAGES[language]),
+        ('user_start_registration', 'Start'),
+        ('select_wallet_type', translations[language]['evm_wallet']),
+        ('collect_user_wallet', wallet),
+        ('save_user_data', referrer),
+    ]
+    for name, text in steps:
+        if await driver.step(name, user_id, text) is None:
+            return False
+        if think:
+            await asyncio.sleep(random.uniform(0, think))
+    return True
+
+
+async def validate(driver, user_ids):
+    await driver.step('admin_start', ADMIN_ID, '/start', expect='Панель администратора')
+    for user_id in user_ids:
+        await driver.step('admin_start_validation', ADMIN_ID, 'Валидация пользователя', expect='Введите ID')
+        await driver.step('confirm_user_validation', ADMIN_ID, str(user_id), expect='подтвержден')
+
+
+async def run(args, api):
+    # Imported late: main.py reads its configuration from the environment at import time
+    import main as bot_main
+    from translations import TRANSLATIONS
+    from update_processor import PerUserUpdateProcessor
+
+    bot = bot_main.WalletBot(bot_main.BOT_TOKEN, ADMIN_ID)
+    service = bot.excel_service
+    # Credentials don't exist here, wait for the failed authorization and plug in the fake client
+    service._clients_ready.wait()
+    client = FakeClient(Conditions(
+        args.sheets_latency, args.sheets_jitter, args.sheets_distribution,
+        args.sheets_read_quota, args.sheets_write_quota, error_rate=args.sheets_error_rate, seed=args.seed,
+    ))
+    sheets_server = None
+    if args.sheets_http:
+        # Real gspread client over HTTP, so its request and error handling is measured too
+        sheets_server = SheetsServer(client)
+        threading.Thread(target=sheets_server.serve_forever, daemon=True).start()
+        service.sheets_client = http_client(sheets_server.url)
+    else:
+        service.sheets_client = client
+    service.sheet_handles.invalidate()
+
+    if args.concurrency:
+        bot_main.PerUserUpdateProcessor = lambda: PerUserUpdateProcessor(args.concurrency)
+    application = bot.build_application()
+    await application.initialize()
+    await application.start()
+
+    driver = Driver(application, api, args.timeout)
+    rng = random.Random(args.seed)
+    users = [100000 + i for i in range(args.users)]
+    languages = [rng.choice(list(LANGUAGES)) for _ in users]
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            register(driver, TRANSLATIONS, user_id, language, args.think)
+            for user_id, language in zip(users, languages)
+        ))
+        registration_time = time.perf_counter() - started
+
+        to_validate = [user_id for user_id, ok in zip(users, results) if ok][:args.validate]
+        started = time.perf_counter()
+        await validate(driver, to_validate)
+        validation_time = time.perf_counter() - started
+    finally:
+        await application.stop()
+        await application.shutdown()
+
+    # Mirror everything that is still queued, as the background thread would
+    started = time.perf_counter()
+    while service.store.outbox_depth()[0] and time.perf_counter() - started < args.timeout:
+        if not service.replicator.flush():
+            await asyncio.sleep(0.5)
+    mirror_time = time.perf_counter() - started
+    sheet = client.sheets.get(SHEET_ID)
+    stored = service.store.stats()['registrations']
+    service.close()
+    if sheets_server:
+        sheets_server.shutdown()
+
+    registered = sum(results)
+    return {
+        'registered': registered,
+        'stored': stored,
+        'validated': len(to_validate),
+        'registration_time': registration_time,
+        'registrations_per_s': registered / registration_time if registration_time else 0.0,
+        'validation_time': validation_time,
+        'validations_per_s': len(to_validate) / validation_time if validation_time and to_validate else 0.0,
+        'mirror_drain_time': mirror_time,
+        'sheet_rows': len(sheet.rows) if sheet else 0,
+        'sheets_calls': dict(sheet.calls) if sheet else {},
+        'sheets_conditions': client.conditions.stats(),
+        'bot_api_calls': dict(api.calls),
+        'steps': {name: summarize(values) for name, values in driver.latencies.items()},
+        'errors': driver.errors[:50],
+        'error_count': len(driver.errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--validate', type=int, default=50, help='users the admin validates afterwards')
+    parser.add_argument('--concurrency', type=int, default=0, help='UPDATE_CONCURRENCY override')
+    parser.add_argument('--sheets-latency', type=float, default=0.05, help='median seconds per Sheets request')
+    parser.add_argument('--sheets-jitter', type=float, default=0.0)
+    parser.add_argument('--sheets-distribution', default='fixed', choices=['fixed', 'uniform', 'lognormal'])
+    parser.add_argument('--sheets-read-quota', type=int, default=0, help='read requests per minute, 0 is unlimited')
+    parser.add_argument('--sheets-write-quota', type=int, default=0, help='write requests per minute, 0 is unlimited')
+    parser.add_argument('--sheets-error-rate', type=float, default=0.0, help='share of Sheets requests failing with a 5xx')
+    parser.add_argument('--sheets-http', action='store_true', help='serve the fake sheets over HTTP to the real gspread client')
+    parser.add_argument('--think', type=float, default=0.0, help='max random pause between user steps')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait for each reply')
+    parser.add_argument('--no-rate-limit', action='store_true',
+                        help="lift Telegram's send limits to measure the bot itself")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--api-port', type=int, default=8083)
+    parser.add_argument('--output', help='JSON file, default benchmarks/results/load_<time>.json')
+    args = parser.parse_args()
+
+    api = FakeBotApi()
+    server = FakeServer(('127.0.0.1', args.api_port), make_handler(api))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    workdir = tempfile.mkdtemp(prefix='bench_load_')
+    os.makedirs(os.path.join(workdir, 'data'))
+    with open(os.path.join(workdir, 'data', 'excel_link.txt'), 'w') as f:
+        f.write(f'https://docs.google.com/spreadsheets/d/{SHEET_ID}/edit')
+    output = os.path.abspath(args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f"load_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    ))
+    os.chdir(workdir)
+    os.environ.update(
+        BOT_TOKEN='123456:FAKE',
+        ADMIN_ID=str(ADMIN_ID),
+        TELEGRAM_API_URL=f'http://127.0.0.1:{args.api_port}/bot',
+        STORE_FILE=os.path.join(workdir, 'registrations.db'),
+        GOOGLE_SHEETS_CREDS_FILE=os.path.join(workdir, 'missing.json'),
+        GOOGLE_DRIVE_CREDS_FILE=os.path.join(workdir, 'missing.json'),
+        METRICS_PORT='0',
+    )
+    if args.no_rate_limit:
+        os.environ.update(OUTBOUND_GLOBAL_RATE='100000', OUTBOUND_CHAT_RATE='100000', OUTBOUND_CHAT_BURST='100000')
+
+    try:
+        result = asyncio.run(run(args, api))
+    finally:
+        server.shutdown()
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'peak_rss_mib': peak_rss_mib(),
+        **result,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"registered {report['registered']}/{args.users} in {report['registration_time']:.2f}s "
+          f"({report['registrations_per_s']:.1f}/s), validated {report['validated']} "
+          f"({report['validations_per_s']:.1f}/s), peak RSS {report['peak_rss_mib']:.0f} MiB")
+    print(f"Sheets requests: {report['sheets_conditions']}")
+    print(f"{'step':<26} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, stats in report['steps'].items():
+        print(f"{name:<26} {stats['count']:>6} {stats['p50'] * 1000:>8.1f} "
+              f"{stats['p95'] * 1000:>8.1f} {stats['p99'] * 1000:>8.1f}")
+    if report['error_count']:
+        print(f"{report['error_count']} errors, first: {report['errors'][0]}")
+    print(f'saved {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Compare pandas and streaming openpyxl duplicate checks on the xlsx path.
+
+Usage: python benchmarks/bench_xlsx.py --rows 10000 50000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from openpyxl import Workbook
+
+import xlsx_reader
+from sheet_mirror import SHEET_HEADERS
+
+
+def make_workbook(rows):
+    """Workbook with the bot's columns and `rows` registrations"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(SHEET_HEADERS)
+    for i in range(rows):
+        sheet.append([str(100000 + i), f'user{i}', f'0x{i:040x}', f'0x{i + 1:040x}', ''])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def pandas_check(content, wallet, user_data):
+    """What save_user_data did before: full frame, lowercased copy, concat"""
+    df = pd.read_excel(BytesIO(content), engine='openpyxl')
+    if not df.empty and wallet.lower() in df['Пользовательский кошелек'].str.lower().values:
+        return True
+    pd.concat([df, pd.DataFrame([user_data])], ignore_index=True)
+    return False
+
+
+def streaming_check(content, wallet, user_data):
+    if xlsx_reader.wallet_exists(BytesIO(content), wallet):
+        return True
+    [user_data[header] for header in SHEET_HEADERS]
+    return False
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    # Worst case for both: the wallet is not in the file
+    wallet = '0x' + 'f' * 40
+    user_data = dict(zip(SHEET_HEADERS, ['1', 'new', wallet, '0x' + 'e' * 40, '']))
+
+    print(f"{'rows':>8} {'file KB':>8} {'pandas s':>9} {'pandas MB':>10} {'stream s':>9} {'stream MB':>10}")
+    for rows in args.rows:
+        content = make_workbook(rows)
+        pandas_time, pandas_peak = measure(pandas_check, content, wallet, user_data)
+        stream_time, stream_peak = measure(streaming_check, content, wallet, user_data)
+        print(
+            f"{rows:>8} {len(content) / 1024:>8.0f} "
+            f"{pandas_time:>9.3f} {pandas_peak / 2 ** 20:>10.1f} "
+            f"{stream_time:>9.3f} {stream_peak / 2 ** 20:>10.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
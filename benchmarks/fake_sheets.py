@@ -0,0 +1,569 @@
+"""Offline stand-in for the Google Sheets API used by ExcelService.
+
+FakeClient replaces the gspread client in memory: open_by_key,
+get_file_drive_metadata, sheet1, worksheet, add_worksheet, get_all_values, col_values, append_row(s), update_cell, insert_row,
+batch_get and batch_update. Conditions make it behave like Google: a latency
+distribution, per-minute read/write quotas answered with 429 and transient
+500/503 errors, raised as the same gspread APIError the real client raises.
+
+SheetsServer serves the same sheets over HTTP as a subset of the Sheets v4
+REST API, and http_client() returns a real gspread.Client talking to it, so
+gspread's own request and error handling is exercised too:
+
+    client = FakeClient(Conditions(latency=0.2, jitter=0.5, distribution='lognormal', write_quota=60))
+    server = SheetsServer(client)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sheet = http_client(server.url).open_by_key('test').sheet1
+
+Run the module to serve standalone: python benchmarks/fake_sheets.py --port 8090 --read-quota 60
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import requests
+from gspread.exceptions import APIError, WorksheetNotFound
+
+SHEETS_API = 'https://sheets.googleapis.com/'
+_CELL_RE = re.compile(r'^([A-Za-z]*)(\d*)$')
+
+
+def api_error(code, message, status):
+    """APIError carrying a response shaped like Google's error body"""
+    response = requests.Response()
+    response.status_code = code
+    response.headers['Content-Type'] = 'application/json; charset=UTF-8'
+    response._content = json.dumps({'error': {'code': code, 'message': message, 'status': status}}).encode()
+    return APIError(response)
+
+
+class Conditions:
+    """How the fake API behaves.
+
+    latency is the median request time in seconds. distribution 'fixed' uses
+    it as is, 'uniform' spreads it by ±jitter seconds and 'lognormal' uses
+    jitter as sigma, which gives the long tail Google has. read_quota and
+    write_quota are requests allowed per quota_window seconds (0 is
+    unlimited), error_rate is the share of requests failing with a 5xx.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, distribution='fixed', read_quota=0, write_quota=0,
+                 quota_window=60.0, error_rate=0.0, seed=None):
+        if distribution not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f'Unknown latency distribution {distribution}')
+        self.latency = latency
+        self.jitter = jitter
+        self.distribution = distribution
+        self.quotas = {'read': read_quota, 'write': write_quota}
+        self.quota_window = quota_window
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._accepted = {'read': deque(), 'write': deque()}
+        self.requests = 0
+        self.throttled = 0
+        self.failed = 0
+
+    def delay(self):
+        if not self.latency:
+            return 0.0
+        if self.distribution == 'uniform':
+            return max(self._random.uniform(self.latency - self.jitter, self.latency + self.jitter), 0.0)
+        if self.distribution == 'lognormal':
+            return self._random.lognormvariate(math.log(self.latency), self.jitter)
+        return self.latency
+
+    def apply(self, kind):
+        """Wait for the request's latency, raise APIError when Google would fail it"""
+        with self._lock:
+            self.requests += 1
+            delay = self.delay()
+            error = self._check(kind)
+        if delay:
+            time.sleep(delay)
+        if error:
+            raise error
+
+    def _check(self, kind):
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.failed += 1
+            if self._random.random() < 0.5:
+                return api_error(500, 'Internal error encountered.', 'INTERNAL')
+            return api_error(503, 'The service is currently unavailable.', 'UNAVAILABLE')
+
+        quota = self.quotas[kind]
+        if quota:
+            accepted = self._accepted[kind]
+            now = time.monotonic()
+            while accepted and accepted[0] <= now - self.quota_window:
+                accepted.popleft()
+            if len(accepted) >= quota:
+                self.throttled += 1
+                name = 'Read requests' if kind == 'read' else 'Write requests'
+                return api_error(
+                    429,
+                    f"Quota exceeded for quota metric '{name}' and limit '{name} per minute per user' "
+                    f"of service 'sheets.googleapis.com'.",
+                    'RESOURCE_EXHAUSTED',
+                )
+            accepted.append(now)
+        return None
+
+    def stats(self):
+        return {'requests': self.requests, 'throttled': self.throttled, 'failed': self.failed}
+
+
+def _col_index(letters):
+    index = 0
+    for char in letters.upper():
+        index = index * 26 + ord(char) - ord('A') + 1
+    return index
+
+
+def _col_letters(index):
+    letters = ''
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(ord('A') + rest) + letters
+    return letters
+
+
+def split_range(range_name):
+    """"'Sheet1'!A1:B2" -> ('Sheet1', 'A1:B2'), a quoted title alone has no cells"""
+    if '!' in range_name:
+        title, cells = range_name.rsplit('!', 1)
+    elif range_name.startswith("'"):
+        title, cells = range_name, ''
+    else:
+        title, cells = None, range_name
+    if title and title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title, cells
+
+
+def parse_cells(cells):
+    """'A1:B2' -> (1, 1, 2, 2), open ends are None, '' is the whole sheet"""
+    if not cells:
+        return 1, 1, None, None
+    start, _, end = cells.partition(':')
+    start_col, start_row = _CELL_RE.match(start).groups()
+    r1 = int(start_row) if start_row else 1
+    c1 = _col_index(start_col) if start_col else 1
+    if not end:
+        return r1, c1, r1 if start_row else None, c1 if start_col else None
+    end_col, end_row = _CELL_RE.match(end).groups()
+    return r1, c1, int(end_row) if end_row else None, _col_index(end_col) if end_col else None
+
+
+class FakeWorksheet:
+    """In-memory worksheet, each method costs the same API requests as in gspread"""
+
+    def __init__(self, rows=None, conditions=None, title='Sheet1', index=0):
+        self.rows = [[str(value) for value in row] for row in rows or []]
+        self.conditions = conditions or Conditions()
+        self.title = title
+        self.id = index
+        self.index = index
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def request(self, name, kind):
+        """Account one API request; raises APIError for throttled or failed ones"""
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        self.conditions.apply(kind)
+
+    # Storage, the way the API sees it; callers hold no lock and make no request
+
+    def read(self, cells='', major='ROWS'):
+        """Values of a range, trailing empty rows and cells trimmed like the API does"""
+        r1, c1, r2, c2 = parse_cells(cells)
+        with self.lock:
+            last_row = len(self.rows) if r2 is None else min(r2, len(self.rows))
+            values = []
+            for row in self.rows[r1 - 1:last_row]:
+                part = row[c1 - 1:] if c2 is None else row[c1 - 1:c2]
+                while part and not part[-1]:
+                    part = part[:-1]
+                values.append(part)
+        while values and not values[-1]:
+            values.pop()
+        if major == 'COLUMNS':
+            width = max((len(row) for row in values), default=0)
+            values = [[row[i] if i < len(row) else '' for row in values] for i in range(width)]
+            for column in values:
+                while column and not column[-1]:
+                    column.pop()
+        return values
+
+    def write(self, cells, values):
+        """Write a block of values starting at the range's top-left cell, returns the updated range"""
+        r1, c1, _, _ = parse_cells(cells)
+        with self.lock:
+            for i, row in enumerate(values):
+                for j, value in enumerate(row):
+                    self._set(r1 + i, c1 + j, value)
+        width = max((len(row) for row in values), default=1)
+        return f"'{self.title}'!{_col_letters(c1)}{r1}:{_col_letters(c1 + width - 1)}{r1 + len(values) - 1}"
+
+    def append(self, values, cells=''):
+        """Add rows after the table found at the range, returns the updated range.
+
+        Without cells that is after the last non-empty row; with a start row it
+        is the first empty row from there, which is where insert_row's append lands.
+        """
+        with self.lock:
+            if cells:
+                first = parse_cells(cells)[0]
+                while first <= len(self.rows) and any(self.rows[first - 1]):
+                    first += 1
+            else:
+                while self.rows and not any(self.rows[-1]):
+                    self.rows.pop()
+                first = len(self.rows) + 1
+        return self.write(f'A{first}', values)
+
+    def insert_dimension(self, start_index, end_index):
+        with self.lock:
+            for _ in range(end_index - start_index):
+                self.rows.insert(start_index, [])
+
+    def _set(self, row, col, value):
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        cells.extend([''] * (col - len(cells)))
+        cells[col - 1] = '' if value is None else str(value)
+
+    def properties(self):
+        with self.lock:
+            rows = len(self.rows)
+        return {
+            'sheetId': self.id,
+            'title': self.title,
+            'index': self.index,
+            'sheetType': 'GRID',
+            'gridProperties': {'rowCount': max(rows, 1000), 'columnCount': 26},
+        }
+
+    # gspread.Worksheet surface
+
+    @property
+    def row_count(self):
+        return self.properties()['gridProperties']['rowCount']
+
+    @property
+    def col_count(self):
+        return self.properties()['gridProperties']['columnCount']
+
+    def get_all_values(self, **kwargs):
+        self.request('get_all_values', 'read')
+        values = self.read()
+        # gspread pads the rows to a rectangle
+        width = max((len(row) for row in values), default=0)
+        return [row + [''] * (width - len(row)) for row in values]
+
+    def col_values(self, col, **kwargs):
+        self.request('col_values', 'read')
+        letters = _col_letters(col)
+        values = self.read(f'{letters}1:{letters}', major='COLUMNS')
+        return values[0] if values else []
+
+    def batch_get(self, ranges, **kwargs):
+        self.request('batch_get', 'read')
+        return [self.read(split_range(range_name)[1]) for range_name in ranges]
+
+    def append_rows(self, values, **kwargs):
+        self.request('append_rows', 'write')
+        updated_range = self.append(values)
+        return {
+            'tableRange': f"'{self.title}'!A1",
+            'updates': {'updatedRange': updated_range, 'updatedRows': len(values)},
+        }
+
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    def insert_row(self, values, index=1, **kwargs):
+        # gspread inserts the empty row and then fills it: two requests
+        self.request('insert_row', 'write')
+        self.insert_dimension(index - 1, index)
+        self.request('insert_row', 'write')
+        return {'updatedRange': self.write(f'A{index}', [values])}
+
+    def update_cell(self, row, col, value):
+        self.request('update_cell', 'write')
+        return {'updatedRange': self.write(f'{_col_letters(col)}{row}', [[value]])}
+
+    def batch_update(self, data, **kwargs):
+        self.request('batch_update', 'write')
+        for item in data:
+            self.write(split_range(item['range'])[1], item['values'])
+        return {'totalUpdatedCells': sum(len(row) for item in data for row in item['values'])}
+
+
+class FakeSpreadsheet:
+    def __init__(self, client, key):
+        self.id = key
+        self._client = client
+
+    def _request(self, name, kind):
+        # Spreadsheet-level requests are counted on the first worksheet
+        self._client.worksheet(self.id).request(name, kind)
+
+    @property
+    def sheet1(self):
+        # gspread fetches the metadata again to build the worksheet
+        self._request('fetch_sheet_metadata', 'read')
+        return self._client.worksheet(self.id)
+
+    def worksheet(self, title):
+        self._request('fetch_sheet_metadata', 'read')
+        worksheet = self._client.find(self.id, title)
+        if worksheet is None:
+            raise WorksheetNotFound(title)
+        return worksheet
+
+    def worksheets(self):
+        self._request('fetch_sheet_metadata', 'read')
+        return self._client.worksheets(self.id)
+
+    def add_worksheet(self, title, rows=1000, cols=26, **kwargs):
+        self._request('add_worksheet', 'write')
+        if self._client.find(self.id, title) is not None:
+            raise api_error(400, f'A sheet with the name "{title}" already exists.', 'INVALID_ARGUMENT')
+        return self._client.worksheet(self.id, title)
+
+
+class FakeClient:
+    """gspread.Client replacement: every key opens its own in-memory spreadsheet.
+
+    sheets holds the worksheets by shard name: the key for the first one,
+    'key/title' for the others.
+    """
+
+    def __init__(self, conditions=None):
+        self.conditions = conditions or Conditions()
+        self.sheets = {}
+        self._lock = threading.Lock()
+
+    def worksheet(self, key, title=None):
+        """Worksheet of a spreadsheet, the first one without a title; added if missing"""
+        with self._lock:
+            if key not in self.sheets:
+                self.sheets[key] = FakeWorksheet(conditions=self.conditions)
+            if title is None or title == self.sheets[key].title:
+                return self.sheets[key]
+            name = f'{key}/{title}'
+            if name not in self.sheets:
+                index = sum(1 for other in self.sheets if other.split('/', 1)[0] == key)
+                self.sheets[name] = FakeWorksheet(conditions=self.conditions, title=title, index=index)
+            return self.sheets[name]
+
+    def find(self, key, title=None):
+        """Existing worksheet by title, None if there is none"""
+        with self._lock:
+            first = self.sheets.get(key)
+            if first and (title is None or title == first.title):
+                return first
+            return self.sheets.get(f'{key}/{title}') if first else None
+
+    def worksheets(self, key):
+        self.worksheet(key)
+        with self._lock:
+            return [sheet for name, sheet in self.sheets.items() if name.split('/', 1)[0] == key]
+
+    def get_file_drive_metadata(self, key):
+        """Drive metadata; modifiedTime changes whenever any cell of the spreadsheet does"""
+        worksheets = self.worksheets(key)
+        with self._lock:
+            content = repr([sheet.rows for sheet in worksheets]).encode()
+        return {'id': key, 'name': key, 'modifiedTime': hashlib.blake2b(content, digest_size=8).hexdigest()}
+
+    def open_by_key(self, key):
+        self.worksheet(key).request('fetch_sheet_metadata', 'read')
+        return FakeSpreadsheet(self, key)
+
+
+class _SheetsHandler(BaseHTTPRequestHandler):
+    """Sheets v4 endpoints gspread uses for the FakeWorksheet methods"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+        prefix = '/v4/spreadsheets/'
+        if not url.path.startswith(prefix):
+            self._reply(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+            return
+        key, _, rest = url.path[len(prefix):].partition('/')
+        key, _, action = key.partition(':')
+        key = unquote(key)
+        client = self.server.client
+        # Spreadsheet-level requests are counted on the first worksheet, ranges pick their own
+        worksheet = client.worksheet(key)
+        major = query.get('majorDimension', ['ROWS'])[0]
+
+        def target(range_name):
+            title = split_range(range_name)[0]
+            found = client.find(key, title)
+            if found is None:
+                raise api_error(400, f'Unable to parse range: {range_name}', 'INVALID_ARGUMENT')
+            return found
+
+        try:
+            if method == 'GET' and not rest and not action:
+                worksheet.request('spreadsheets.get', 'read')
+                result = {'spreadsheetId': key, 'properties': {'title': key, 'locale': 'en_US', 'timeZone': 'Etc/GMT'},
+                          'sheets': [{'properties': sheet.properties()} for sheet in client.worksheets(key)]}
+            elif method == 'POST' and action == 'batchUpdate':
+                worksheet.request('spreadsheets.batchUpdate', 'write')
+                replies = []
+                for request in body.get('requests', []):
+                    reply = {}
+                    if 'insertDimension' in request:
+                        dimension = request['insertDimension']['range']
+                        sheets = {sheet.id: sheet for sheet in client.worksheets(key)}
+                        sheets[dimension.get('sheetId', 0)].insert_dimension(dimension['startIndex'], dimension['endIndex'])
+                    elif 'addSheet' in request:
+                        title = request['addSheet']['properties']['title']
+                        if client.find(key, title) is not None:
+                            raise api_error(400, f'A sheet with the name "{title}" already exists.', 'INVALID_ARGUMENT')
+                        reply = {'addSheet': {'properties': client.worksheet(key, title).properties()}}
+                    replies.append(reply)
+                result = {'spreadsheetId': key, 'replies': replies}
+            elif method == 'GET' and rest == 'values:batchGet':
+                worksheet.request('values.batchGet', 'read')
+                result = {'spreadsheetId': key, 'valueRanges': [
+                    {'range': range_name, 'majorDimension': major,
+                     'values': target(range_name).read(split_range(range_name)[1], major)}
+                    for range_name in query.get('ranges', [])
+                ]}
+            elif method == 'POST' and rest == 'values:batchUpdate':
+                worksheet.request('values.batchUpdate', 'write')
+                ranges = [target(item['range']).write(split_range(item['range'])[1], item['values'])
+                          for item in body.get('data', [])]
+                result = {'spreadsheetId': key, 'totalUpdatedCells': sum(
+                    len(row) for item in body.get('data', []) for row in item['values']
+                ), 'responses': [{'updatedRange': updated} for updated in ranges]}
+            elif rest.startswith('values/'):
+                range_name = unquote(rest[len('values/'):])
+                if method == 'POST' and range_name.endswith(':append'):
+                    worksheet.request('values.append', 'write')
+                    sheet = target(range_name[:-len(':append')])
+                    cells = split_range(range_name[:-len(':append')])[1]
+                    updated = sheet.append(body.get('values', []), cells)
+                    result = {'spreadsheetId': key, 'tableRange': f"'{sheet.title}'!A1",
+                              'updates': {'updatedRange': updated, 'updatedRows': len(body.get('values', []))}}
+                elif method == 'PUT':
+                    worksheet.request('values.update', 'write')
+                    updated = target(range_name).write(split_range(range_name)[1], body.get('values', []))
+                    result = {'spreadsheetId': key, 'updatedRange': updated}
+                else:
+                    worksheet.request('values.get', 'read')
+                    values = target(range_name).read(split_range(range_name)[1], major)
+                    result = {'range': range_name, 'majorDimension': major}
+                    if values:
+                        result['values'] = values
+            else:
+                self._reply(404, {'error': {'code': 404, 'message': f'Unsupported {method} {url.path}', 'status': 'NOT_FOUND'}})
+                return
+        except APIError as e:
+            self._reply(e.response.status_code, e.response.json())
+            return
+        self._reply(200, result)
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SheetsServer(ThreadingHTTPServer):
+    """Serves a FakeClient's sheets over HTTP, port 0 picks a free one"""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, client, address=('127.0.0.1', 0)):
+        super().__init__(address, _SheetsHandler)
+        self.client = client
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/'
+
+
+class _RedirectAdapter(requests.adapters.HTTPAdapter):
+    def __init__(self, base_url):
+        super().__init__(pool_maxsize=32)
+        self.base_url = base_url.rstrip('/') + '/'
+
+    def send(self, request, **kwargs):
+        request.url = self.base_url + request.url[len(SHEETS_API):]
+        return super().send(request, **kwargs)
+
+
+def http_client(url):
+    """Real gspread.Client whose Sheets API requests go to the SheetsServer at url"""
+    import gspread
+
+    session = requests.Session()
+    session.mount(SHEETS_API, _RedirectAdapter(url))
+    return gspread.Client(None, session=session)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve fake Google Sheets over HTTP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.0, help='median seconds per request')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--distribution', default='fixed', choices=['fixed', 'uniform', 'lognormal'])
+    parser.add_argument('--read-quota', type=int, default=0, help='read requests per minute, 0 is unlimited')
+    parser.add_argument('--write-quota', type=int, default=0, help='write requests per minute, 0 is unlimited')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests failing with a 5xx')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    conditions = Conditions(args.latency, args.jitter, args.distribution, args.read_quota, args.write_quota,
+                            error_rate=args.error_rate, seed=args.seed)
+    server = SheetsServer(FakeClient(conditions), (args.host, args.port))
+    print(f'Fake Sheets API at {server.url}, use fake_sheets.http_client({server.url!r})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(conditions.stats()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""Fake Telegram harness: a local Bot API server plus an update generator.
+
+Starts the bot (main.py) against a fake Bot API, sends /start from N users
+and measures update -> reply latency and Bot API traffic. In webhook mode
+updates are POSTed to the bot's embedded server with the secret token; in
+polling mode they are handed out through getUpdates.
+
+Usage:
+    python benchmarks/fake_telegram.py --mode webhook --users 200
+    python benchmarks/fake_telegram.py --mode polling --users 200
+    python benchmarks/fake_telegram.py --mode webhook --no-launch   # bot started by hand
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeBotApi:
+    """Minimal Bot API: getMe, webhook setup, long-polled getUpdates, replies are recorded"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.updates = []
+        self.webhook = None
+        self.polling = False
+        self.replies = {}  # chat id -> time of first reply
+        self.calls = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.message_id = 0
+        self.listeners = []  # listener(method, params) is called for every sent message
+
+    def call(self, method, params):
+        with self.cond:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+        if method == 'setWebhook':
+            with self.cond:
+                self.webhook = params
+                self.cond.notify_all()
+            return True
+        if method == 'getUpdates':
+            return self._get_updates(params)
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params.get('chat_id', 0))
+            for listener in self.listeners:
+                listener(method, params)
+            with self.cond:
+                self.replies.setdefault(chat_id, time.perf_counter())
+                self.message_id += 1
+                self.cond.notify_all()
+                return {
+                    'message_id': self.message_id,
+                    'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'private'},
+                    'text': params.get('text', ''),
+                }
+        return True
+
+    def _get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            self.polling = True
+            self.cond.notify_all()
+            # Confirmed updates are dropped, like the real server does
+            self.updates = [u for u in self.updates if u['update_id'] >= offset]
+            while not self.updates and time.monotonic() < deadline:
+                self.cond.wait(deadline - time.monotonic())
+            return list(self.updates[:100])
+
+    def push(self, update):
+        with self.cond:
+            self.updates.append(update)
+            self.cond.notify_all()
+
+    def wait_ready(self, mode, timeout):
+        """Wait until the bot registered its webhook or started polling"""
+        with self.cond:
+            return self.cond.wait_for(
+                lambda: self.webhook if mode == 'webhook' else self.polling, timeout
+            )
+
+    def wait_replies(self, count, timeout):
+        with self.cond:
+            return self.cond.wait_for(lambda: len(self.replies) >= count, timeout)
+
+
+class FakeServer(ThreadingHTTPServer):
+    """Threaded server with a listen backlog that survives bursts of parallel requests"""
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def make_handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real Bot API
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            method = self.path.rstrip('/').rsplit('/', 1)[-1]
+            if 'json' in (self.headers.get('Content-Type') or ''):
+                params = json.loads(body or b'{}')
+            else:
+                params = dict(parse_qsl(body.decode()))
+            response = json.dumps({'ok': True, 'result': api.call(method, params)}).encode()
+            with api.cond:
+                api.bytes_in += len(body) + len(self.requestline)
+                api.bytes_out += len(response)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+        do_GET = do_POST
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def make_update(update_id, user_id):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+            'text': '/start',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+        },
+    }
+
+
+def post_update(url, secret, update):
+    """POST one update to the webhook, returns (status, bytes sent)"""
+    body = json.dumps(update).encode()
+    request = urllib.request.Request(url, data=body, headers={
+        'Content-Type': 'application/json',
+        'X-Telegram-Bot-Api-Secret-Token': secret,
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, len(body)
+    except urllib.error.HTTPError as e:
+        return e.code, len(body)
+
+
+def launch_bot(args, api_url):
+    workdir = tempfile.mkdtemp(prefix='fake_telegram_')
+    env = dict(
+        os.environ,
+        BOT_TOKEN='123456:FAKE',
+        ADMIN_ID='1',
+        TELEGRAM_API_URL=f'{api_url}/bot',
+        BOT_MODE=args.mode,
+        WEBHOOK_URL=f'http://127.0.0.1:{args.webhook_port}',
+        WEBHOOK_LISTEN='127.0.0.1',
+        WEBHOOK_PORT=str(args.webhook_port),
+        WEBHOOK_PATH='webhook',
+        WEBHOOK_SECRET=args.secret,
+        STORE_FILE=os.path.join(workdir, 'registrations.db'),
+    )
+    # Runs in an empty directory, so the bot answers /start with the "not configured" message
+    return subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'main.py')], cwd=workdir, env=env,
+        stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['webhook', 'polling'], default='webhook')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20, help='parallel webhook POSTs')
+    parser.add_argument('--api-port', type=int, default=8081)
+    parser.add_argument('--webhook-port', type=int, default=8443)
+    parser.add_argument('--secret', default='bench-secret')
+    parser.add_argument('--no-launch', action='store_true', help='bot is started separately')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--verbose', action='store_true', help='show bot logs')
+    args = parser.parse_args()
+
+    api = FakeBotApi()
+    server = FakeServer(('127.0.0.1', args.api_port), make_handler(api))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f'http://127.0.0.1:{args.api_port}'
+
+    bot = None if args.no_launch else launch_bot(args, api_url)
+    try:
+        if not api.wait_ready(args.mode, args.timeout):
+            print(f'Bot did not start {args.mode} within {args.timeout}s (Bot API: {api_url}/bot<token>)')
+            return 1
+
+        webhook_url = f'http://127.0.0.1:{args.webhook_port}/webhook'
+        if args.mode == 'webhook':
+            webhook_url = api.webhook.get('url', webhook_url)
+            print(f"allowed_updates: {api.webhook.get('allowed_updates')}")
+            # setWebhook is sent before the embedded server listens, wait for it
+            deadline = time.monotonic() + args.timeout
+            while True:
+                try:
+                    status, _ = post_update(webhook_url, 'wrong-secret', make_update(0, 999))
+                    break
+                except urllib.error.URLError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.1)
+            print(f'Update with wrong secret token: HTTP {status}')
+
+        bytes_before = api.bytes_in + api.bytes_out
+        sent = {}
+        started = time.perf_counter()
+        webhook_bytes = 0
+        if args.mode == 'webhook':
+            def send(i):
+                user_id = 10000 + i
+                sent[user_id] = time.perf_counter()
+                return post_update(webhook_url, args.secret, make_update(i + 1, user_id))
+
+            with ThreadPoolExecutor(args.concurrency) as executor:
+                results = list(executor.map(send, range(args.users)))
+            failed = [status for status, _ in results if status != 200]
+            webhook_bytes = sum(size for _, size in results)
+            if failed:
+                print(f'{len(failed)} webhook POSTs failed: {sorted(set(failed))}')
+        else:
+            for i in range(args.users):
+                user_id = 10000 + i
+                sent[user_id] = time.perf_counter()
+                api.push(make_update(i + 1, user_id))
+
+        complete = api.wait_replies(args.users, args.timeout)
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(api.replies[uid] - sent[uid] for uid in sent if uid in api.replies)
+        print(f'mode: {args.mode}, users: {args.users}, replies: {len(latencies)}'
+              + ('' if complete else ' (timed out)'))
+        if latencies:
+            print(f'elapsed: {elapsed:.2f}s, throughput: {len(latencies) / elapsed:.1f} updates/s')
+            print(f'latency p50: {statistics.median(latencies) * 1000:.1f}ms, '
+                  f'p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms, '
+                  f'max: {latencies[-1] * 1000:.1f}ms')
+        traffic = api.bytes_in + api.bytes_out - bytes_before + webhook_bytes
+        print(f'traffic: {traffic / 1024:.1f} KiB, Bot API calls: {api.calls}')
+        return 0
+    finally:
+        if bot:
+            bot.terminate()
+            bot.wait(10)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
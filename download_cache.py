@@ -0,0 +1,125 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class CachedDownload:
+    """Downloaded file on disk with its HTTP validators"""
+
+    def __init__(self, path, size, etag=None, last_modified=None):
+        self.path = path
+        self.file_size = size
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def size(self):
+        return self.file_size
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class DownloadCache:
+    """LRU cache of downloaded workbooks keyed by URL, revalidated with ETag / Last-Modified.
+    File contents are kept on disk and re-read by the streaming xlsx reader"""
+
+    def __init__(self, max_bytes=None, cache_dir=None):
+        self.max_bytes = max_bytes or int(os.getenv('DOWNLOAD_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+        self.cache_dir = cache_dir or os.getenv(
+            'DOWNLOAD_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'wallet_bot_cache')
+        )
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry:
+                self._entries.move_to_end(url)
+            return entry
+
+    def validators(self, url):
+        """Conditional request headers for the cached copy of url"""
+        entry = self.get(url)
+        headers = {}
+        if entry:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def hit(self, url):
+        """Server answered 304, returns cached entry"""
+        entry = self.get(url)
+        if entry:
+            self.hits += 1
+        return entry
+
+    def open(self, entry):
+        """New read handle on the cached file, None if it was evicted meanwhile"""
+        try:
+            return open(entry.path, 'rb')
+        except OSError:
+            return None
+
+    def put(self, url, file, etag=None, last_modified=None):
+        """Copy downloaded file into the cache"""
+        self.misses += 1
+        if not etag and not last_modified:
+            # Server gives us nothing to revalidate with, keeping the copy is pointless
+            self.invalidate(url)
+            return None
+
+        fd, path = tempfile.mkstemp(prefix='workbook_', dir=self.cache_dir)
+        with os.fdopen(fd, 'wb') as cached:
+            shutil.copyfileobj(file, cached)
+        file.seek(0)
+        entry = CachedDownload(path, os.path.getsize(path), etag, last_modified)
+
+        with self._lock:
+            previous = self._entries.pop(url, None)
+            if previous:
+                previous.remove()
+            self._entries[url] = entry
+            self._evict()
+        return entry
+
+    def _evict(self):
+        total = sum(entry.size() for entry in self._entries.values())
+        while self._entries and total > self.max_bytes:
+            url, entry = self._entries.popitem(last=False)
+            total -= entry.size()
+            entry.remove()
+            logger.info(f"Evicted {url} from download cache")
+
+    def invalidate(self, url=None):
+        """Drop one cached file, or all of them"""
+        with self._lock:
+            if url is None:
+                entries = list(self._entries.values())
+                self._entries.clear()
+            else:
+                entries = [self._entries.pop(url)] if url in self._entries else []
+        for entry in entries:
+            entry.remove()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(entry.size() for entry in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -1,12 +1,24 @@
-import pandas as pd
-import requests
-from io import BytesIO
+import json
 import logging
 import os
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import threading
+import time
 from telegram import Update
 from telegram.ext import ContextTypes
+from sheet_handles import SheetHandleCache
+from storage_pool import StoragePool
+from download_cache import DownloadCache
+from http_client import HttpClient
+from link_config import FileLink, LinkConfig
+from outbound_limiter import PRIORITY_BULK, PRIORITY_INTERACTIVE
+from registration_store import RegistrationStore
+from shard_router import ShardRouter, has_room, shard_name, split_shard
+from sheet_mirror import SHEET_HEADERS, SheetReplicator
+from sheet_sync import SheetTailSync
+from sheets_budget import QuotaBudget
+from single_flight import SingleFlight
+from startup_timer import STARTUP
+from user_pages import BACK, FORWARD, UserListPages
 
 # Add this constant since it's used in the admin methods
 ADMIN_MENU = 4  # Make sure this matches the state number in main.py
@@ -16,233 +28,397 @@ logger = logging.getLogger(__name__)
 class ExcelService:
     def __init__(self):
         self.link_file = 'data/excel_link.txt'
-        # Initialize Google credentials
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        
-        # Use environment variables for credentials files
-        sheets_creds_file = os.getenv('GOOGLE_SHEETS_CREDS_FILE', 'key_shet.json')
-        drive_creds_file = os.getenv('GOOGLE_DRIVE_CREDS_FILE', 'key_google_drive.json')
-        
+        # Link is cached in memory and re-read only when the file changes
+        self.link_config = LinkConfig(self.link_file)
+        self.link_config.subscribe(self.on_link_changed)
+        self.pool = StoragePool()
+        self.user_pages = UserListPages()
+        self.download_cache = DownloadCache()
+        self.http = HttpClient()
+        # Registrations live in SQLite, the sheet is mirrored from it
+        self.store = RegistrationStore()
+        self._import_lock = threading.Lock()
+        # New registrations are spread over the sheet's shards by wallet hash
+        self.shard_router = ShardRouter(self.store, on_full=self._on_shards_full)
+        self._grown_at = {}  # sheet_id -> when a shard was last added automatically
+        self._grow_lock = threading.Lock()
+        self._full_alerted = set()  # sheet_ids the admin was told have no room for another shard
+        # on_alert(text) sends something that needs the admin's attention, set by the bot
+        self.on_alert = None
+        # Google clients are authorized in background so polling can start right away
+        self.drive_client = None
+        self.sheets_client = None
+        self._clients_ready = threading.Event()
+        threading.Thread(target=self._authorize, name='google-auth', daemon=True).start()
+
+        # Every Sheets request goes through one quota budget
+        self.sheets_budget = QuotaBudget()
+        # Concurrent whole-sheet reads share one request, results stay fresh for a moment
+        self.sheet_reads = SingleFlight(timeout=self.pool.timeout)
+        # Worksheet handles shared by all methods, sheets client is preferred
+        self.sheet_handles = SheetHandleCache(self._google_clients, self.sheets_budget, self.sheet_reads)
+
+        # Store changes are sent to the sheet in batches by a background thread
+        self.replicator = SheetReplicator(self.store, self.sheet_handles.get)
+        self._migrate_journal()
+        self.replicator.start()
+
+        # Rows added or edited by hand in the sheet are pulled back into the store
+        self.sheet_sync = SheetTailSync(
+            self.store, self.sheet_handles.get, self._google_sheet_id, self.replicator, self.sheets_budget,
+            alert=self._alert, get_version=self._spreadsheet_version,
+        )
+        self.sheet_sync.start()
+
+    def _authorize(self):
+        """Initialize Google credentials (gspread and oauth2client are imported here, not at startup)"""
+        started = time.perf_counter()
         try:
+            import gspread
+            from oauth2client.service_account import ServiceAccountCredentials
+
+            scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+
+            # Use environment variables for credentials files
+            sheets_creds_file = os.getenv('GOOGLE_SHEETS_CREDS_FILE', 'key_shet.json')
+            drive_creds_file = os.getenv('GOOGLE_DRIVE_CREDS_FILE', 'key_google_drive.json')
+
             self.drive_creds = ServiceAccountCredentials.from_json_keyfile_name(drive_creds_file, scope)
             self.sheets_creds = ServiceAccountCredentials.from_json_keyfile_name(sheets_creds_file, scope)
-            self.drive_client = gspread.authorize(self.drive_creds)
-            self.sheets_client = gspread.authorize(self.sheets_creds)
+            drive_client = gspread.authorize(self.drive_creds)
+            sheets_client = gspread.authorize(self.sheets_creds)
+            # A hung request must not keep its worker thread (and the locks it holds) forever
+            timeout = (min(10.0, self.pool.timeout), self.pool.timeout)
+            drive_client.set_timeout(timeout)
+            sheets_client.set_timeout(timeout)
+            self.drive_client = drive_client
+            self.sheets_client = sheets_client
         except Exception as e:
             logger.error(f"Error initializing Google credentials: {e}")
             self.drive_client = None
             self.sheets_client = None
+        finally:
+            self._clients_ready.set()
+            STARTUP.mark('google_auth', time.perf_counter() - started)
+
+    def _google_clients(self):
+        """Google clients in order of preference, waits for background authorization"""
+        self._clients_ready.wait(self.pool.timeout)
+        return [('sheets', self.sheets_client), ('drive', self.drive_client)]
+
+    def _migrate_journal(self, journal_file='data/pending_rows.jsonl'):
+        """Move rows left by the old write-behind queue into the store"""
+        if not os.path.exists(journal_file):
+            return
+        try:
+            with open(journal_file, 'r') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    row = item['row']
+                    if not row[0].isdigit():
+                        continue  # header row
+                    self.store.add_registration(item['sheet_id'], {
+                        'Телеграмм ID': row[0],
+                        'Имя пользователя': row[1],
+                        'Пользовательский кошелек': row[2],
+                        'Кошелек реферера': row[3],
+                        'Статус': row[4],
+                    })
+            os.replace(journal_file, f"{journal_file}.migrated")
+            logger.info("Migrated queued rows from old journal")
+        except Exception as e:
+            logger.error(f"Error migrating queue journal: {e}")
+
+    def _spreadsheet_version(self, spreadsheet_id):
+        """Drive modifiedTime of the spreadsheet, None if it cannot be read.
+        Drive requests do not count against the Sheets quota"""
+        self._clients_ready.wait(self.pool.timeout)
+        if self.drive_client is None:
+            return None
+        try:
+            return self.drive_client.get_file_drive_metadata(spreadsheet_id).get('modifiedTime')
+        except Exception as e:
+            logger.warning(f"Could not read version of spreadsheet {spreadsheet_id}: {e}")
+            return None
+
+    def _alert(self, text):
+        if self.on_alert:
+            self.on_alert(text)
+
+    def _google_sheet_id(self):
+        link = self.link_config.get()
+        return link.sheet_id if link and link.is_google_sheet else None
 
     def get_file_link(self):
         """Get the stored file link"""
+        link = self.link_config.get()
+        return link.url if link else None
+
+    def on_link_changed(self, link=None):
+        """Forget everything cached for the previous link"""
+        self.sheet_handles.invalidate()
+        self.download_cache.invalidate()
+
+    async def save_user_data(self, user_data):
+        """Save user data to online file without blocking the event loop"""
         try:
-            if os.path.exists(self.link_file):
-                with open(self.link_file, 'r') as f:
-                    return f.read().strip()
-            return None
+            return await self.pool.run(self._save_user_data_sync, user_data)
         except Exception as e:
-            logger.error(f"Error reading link file: {e}")
-            return None
+            logger.error(f"Error saving user data: {e!r}")
+            return False
 
-    def save_user_data(self, user_data):
+    def _save_user_data_sync(self, user_data):
         """Save user data directly to online file"""
         try:
-            file_link = self.get_file_link()
-            if not file_link:
+            link = self.link_config.get()
+            if not link:
                 raise Exception("No file link configured")
 
-            # For Google Sheets
-            if 'docs.google.com/spreadsheets' in file_link:
-                return self._save_to_google_sheets(file_link, user_data)
+            # For Google Sheets; the user is waiting, so this goes before any other request
+            if link.is_google_sheet:
+                with self.sheets_budget.priority(PRIORITY_INTERACTIVE):
+                    return self._save_to_google_sheets(link.sheet_id, user_data)
             
-            # For regular Excel file
-            file_content = self.download_file(file_link)
-            if not file_content:
-                raise Exception("Could not download file")
-
-            df = pd.read_excel(file_content, engine='openpyxl')
-
-            # Check if wallet already exists
-            if not df.empty and user_data['Пользовательский кошелек'].lower() in df['Пользовательский кошелек'].str.lower().values:
-                logger.error("Wallet already exists")
-                return False
+            # For regular Excel file, stream rows and stop at the first match
+            import xlsx_reader  # openpyxl is only loaded when the xlsx path is used
+            file_content = self.download_file(link.url)
+            try:
+                if xlsx_reader.wallet_exists(file_content, user_data['Пользовательский кошелек']):
+                    logger.error("Wallet already exists")
+                    return False
+            finally:
+                file_content.close()
 
-            # Add new user data
-            df = pd.concat([df, pd.DataFrame([user_data])], ignore_index=True)
+            # Only the new row is built, existing rows are never copied
+            new_row = [user_data[header] for header in SHEET_HEADERS]
             
             # Save back to online file
-            return self._upload_to_service(df, file_link)
+            return self._upload_to_service([new_row], link.url)
 
         except Exception as e:
             logger.error(f"Error saving user data: {e}")
             return False
 
-    def _save_to_google_sheets(self, file_link, user_data):
-        """Save data directly to Google Sheets"""
+    def _save_to_google_sheets(self, sheet_id, user_data):
+        """Save registration to the local store, the sheet mirror catches up in background"""
         try:
-            # Extract sheet ID from link
-            sheet_id = file_link.split('/d/')[1].split('/')[0]
-            
-            # Try both clients with error handling
-            sheet = None
-            last_error = None
-            
-            # Try sheets client
-            try:
-                sheet = self.sheets_client.open_by_key(sheet_id).sheet1
-                logger.info("Successfully connected using sheets client")
-            except Exception as e:
-                logger.error(f"Failed to connect with sheets client: {e}")
-                last_error = e
-                
-                # Try drive client
-                try:
-                    sheet = self.drive_client.open_by_key(sheet_id).sheet1
-                    logger.info("Successfully connected using drive client")
-                except Exception as e:
-                    logger.error(f"Failed to connect with drive client: {e}")
-                    last_error = e
-            
-            if not sheet:
-                raise Exception(f"Could not access sheet with either client. Last error: {last_error}")
-            
-            # Only check if user wallet exists (not referrer)
-            try:
-                # Get the column with user wallets
-                user_wallets = sheet.col_values(3)  # Assuming user wallet is in column 3
-                # Remove header if exists
-                if user_wallets and user_wallets[0] == 'Пользовательский кошелек':
-                    user_wallets = user_wallets[1:]
-                
-                # Check if user wallet exists (case-insensitive)
-                if any(wallet.lower() == user_data['Пользовательский кошелек'].lower() 
-                       for wallet in user_wallets):
-                    logger.error("User wallet already exists")
-                    return False
-            except gspread.exceptions.CellNotFound:
-                pass
-
-            # Get current values to check column headers
-            values = sheet.get_all_values()
-            if not values:
-                # Sheet is empty, add headers
-                headers = [
-                    'Телеграмм ID',
-                    'Имя пользователя',
-                    'Пользовательский кошелек',
-                    'Кошелек реферера',
-                    'Статус'
-                ]
-                sheet.append_row(headers)
-
-            # Add new row
-            new_row = [
-                str(user_data['Телеграмм ID']),
-                str(user_data['Имя пользователя'] or ''),
-                user_data['Пользовательский кошелек'],
-                user_data['Кошелек реферера'],
-                user_data['Статус'] if user_data['Статус'] else ''
-            ]
-            
-            sheet.append_row(new_row)
-            logger.info("Successfully added new row to sheet")
+            self._ensure_imported(sheet_id)
+
+            # Unique index on the wallet makes check and insert one atomic step
+            shard = self.shard_router.route(sheet_id, user_data['Пользовательский кошелек'])
+            if not self.store.add_registration(sheet_id, user_data, shard):
+                logger.error("User wallet already exists")
+                return False
+            self.shard_router.record(shard)
+
+            self.replicator.notify()
+            logger.info("Saved registration, sheet mirror will follow")
             return True
 
         except Exception as e:
             logger.error(f"Error saving to Google Sheets: {e}")
+            # Reopen the sheet next time in case the cached handle went bad
+            self.sheet_handles.invalidate(sheet_id)
             return False
 
+    def _ensure_imported(self, sheet_id):
+        """Copy existing sheet rows into the store the first time a sheet is used"""
+        if self.store.is_imported(sheet_id):
+            return
+        with self._import_lock:
+            if self.store.is_imported(sheet_id):
+                return
+            sheet = self.sheet_handles.get(sheet_id)
+            self.store.import_rows(sheet_id, sheet.get_all_values())
+
+    async def list_shards(self):
+        """Shards of the configured sheet, returns (error message, [(shard, registrations, open)])"""
+        sheet_id = self._google_sheet_id()
+        if not sheet_id:
+            return "Шарды поддерживаются только для Google Sheets.", []
+        return None, await self.pool.run(self.shard_router.stats, sheet_id)
+
+    async def add_shard(self, spec):
+        """Add a worksheet or spreadsheet registrations are spread over, returns (error message, shard)"""
+        try:
+            return await self.pool.run(self._add_shard_sync, spec)
+        except Exception as e:
+            logger.error(f"Error adding shard: {e!r}")
+            return "Не удалось подключить лист.", None
+
+    def _add_shard_sync(self, spec):
+        sheet_id = self._google_sheet_id()
+        if not sheet_id:
+            return "Шарды поддерживаются только для Google Sheets.", None
+
+        # A spreadsheet link adds its first worksheet, anything else is a worksheet of the sheet itself
+        link = FileLink(spec)
+        if link.is_google_sheet and link.sheet_id:
+            shard = link.sheet_id
+        else:
+            shard = shard_name(sheet_id, spec.strip())
+        return self._connect_shard(sheet_id, shard)
+
+    def _connect_shard(self, sheet_id, shard):
+        """Open or add the shard's worksheet, import its rows and start routing to it"""
+        if shard in self.store.shards(sheet_id):
+            return "Этот лист уже подключен.", None
+
+        with self.sheets_budget.priority(PRIORITY_BULK):
+            self._ensure_imported(sheet_id)
+            with self._import_lock:
+                sheet = self.sheet_handles.get(shard, create=True)
+                # Rows already in the worksheet become part of the whitelist
+                self.store.import_rows(sheet_id, sheet.get_all_values(), shard)
+                self.store.add_shard(sheet_id, shard)
+        self.shard_router.forget()
+        self._full_alerted.discard(sheet_id)
+        logger.info(f"Added shard {shard} to sheet {sheet_id}")
+        return None, shard
+
+    def _on_shards_full(self, sheet_id):
+        """Every shard is full: add a worksheet to the last spreadsheet in background"""
+        with self._grow_lock:
+            # One attempt a minute, registrations go to the full shards meanwhile
+            now = time.monotonic()
+            if now - self._grown_at.get(sheet_id, -60.0) < 60:
+                return
+            self._grown_at[sheet_id] = now
+        threading.Thread(target=self._grow, args=(sheet_id,), name='shard-grow', daemon=True).start()
+
+    def _grow(self, sheet_id):
+        try:
+            shards = self.store.shards(sheet_id)
+            spreadsheet_id = split_shard(shards[-1])[0]
+            with self.sheets_budget.priority(PRIORITY_BULK):
+                grid_sizes = self.sheet_handles.grid_sizes(spreadsheet_id)
+            if not has_room(grid_sizes, self.shard_router.max_rows, len(SHEET_HEADERS)):
+                logger.error(
+                    f"All shards of sheet {sheet_id} are full and spreadsheet {spreadsheet_id} has no room "
+                    f"for another one, add a new spreadsheet with /addshard"
+                )
+                self._alert_full(
+                    sheet_id,
+                    f"⚠️ Все листы с регистрациями заполнены, а в таблице {spreadsheet_id} нет места для "
+                    f"нового листа (лимит Google — 10 млн ячеек). Подключите новую таблицу командой /addshard."
+                )
+                return
+            error, _ = self._connect_shard(sheet_id, shard_name(spreadsheet_id, f"Регистрации {len(shards) + 1}"))
+            if error:
+                logger.error(f"Could not add shard to sheet {sheet_id}: {error}")
+        except Exception as e:
+            logger.error(f"Error adding shard to sheet {sheet_id}: {e}")
+            self._alert_full(
+                sheet_id,
+                f"⚠️ Все листы с регистрациями заполнены, и не удалось добавить новый: {e}. "
+                f"Подключите новую таблицу командой /addshard."
+            )
+
+    def _alert_full(self, sheet_id, text):
+        """Tell the admin once until a shard is added, grow is retried every minute"""
+        with self._grow_lock:
+            if sheet_id in self._full_alerted:
+                return
+            self._full_alerted.add(sheet_id)
+        self._alert(text)
+
     async def update_user_status(self, user_id, status):
-        """Update user status in Google Sheets"""
+        """Update user status without blocking the event loop"""
+        try:
+            return await self.pool.run(self._update_user_status_sync, user_id, status)
+        except Exception as e:
+            logger.error(f"Error in update_user_status: {e!r}")
+            return False
+
+    def _update_user_status_sync(self, user_id, status):
+        """Update user status in the store and queue it for the sheet mirror"""
         try:
-            file_link = self.get_file_link()
-            if not file_link:
+            link = self.link_config.get()
+            if not link:
                 logger.error("No file link configured")
                 return False
 
-            # Extract sheet ID from link
-            sheet_id = file_link.split('/d/')[1].split('/')[0]
-
-            # Try both clients
-            sheet = None
-            try:
-                sheet = self.sheets_client.open_by_key(sheet_id).sheet1
-                logger.info("Successfully connected using sheets client")
-            except Exception as e:
-                logger.error(f"Failed with sheets client: {e}")
-                try:
-                    sheet = self.drive_client.open_by_key(sheet_id).sheet1
-                    logger.info("Successfully connected using drive client")
-                except Exception as e:
-                    logger.error(f"Could not access sheet: {e}")
-                    return False
-
-            # Find user row
-            try:
-                # Convert user_id to string for comparison
-                str_user_id = str(user_id)
-                
-                # Get all values
-                values = sheet.get_all_values()
-                if not values:
-                    logger.error("Empty sheet")
-                    return False
-
-                # Find the row with matching user ID
-                user_row = None
-                for i, row in enumerate(values):
-                    if row[0] == str_user_id:  # Assuming Telegram ID is in first column
-                        user_row = i + 1  # +1 because sheet rows are 1-based
-                        break
-
-                if user_row is None:
-                    logger.error(f"User {user_id} not found")
-                    return False
+            sheet_id = link.sheet_id
+            self._ensure_imported(sheet_id)
 
-                # Update status (assuming status is in column 5)
-                sheet.update_cell(user_row, 5, status)
-                logger.info(f"Successfully updated status for user {user_id}")
-                return True
-
-            except Exception as e:
-                logger.error(f"Error finding/updating user: {e}")
+            if not self.store.update_status(sheet_id, user_id, status):
+                logger.error(f"User {user_id} not found")
                 return False
 
+            self.replicator.notify()
+            logger.info(f"Successfully updated status for user {user_id}")
+            return True
+
         except Exception as e:
             logger.error(f"Error in update_user_status: {e}")
             return False
 
-    def download_file(self, url):
-        """Download file from Google Drive or OneDrive"""
+    async def bulk_update_status(self, selector, status):
+        """Set status for every pending user matching selector(telegram_id: int) -> bool.
+        Returns list of updated Telegram IDs or None on error"""
         try:
-            # Handle Google Drive links
-            if 'drive.google.com' in url:
-                file_id = self._get_google_file_id(url)
-                download_url = f'https://drive.google.com/uc?export=download&id={file_id}'
-            # Handle OneDrive links
-            elif '1drv.ms' in url or 'onedrive.live.com' in url:
-                download_url = url.replace('view.aspx', 'download.aspx')
-            # Handle direct links
-            else:
-                download_url = url
+            return await self.pool.run(self._bulk_update_status_sync, selector, status)
+        except Exception as e:
+            logger.error(f"Error in bulk_update_status: {e!r}")
+            return None
+
+    def _bulk_update_status_sync(self, selector, status):
+        """Update all matching pending users in one transaction, the mirror batches the sheet writes"""
+        link = self.link_config.get()
+        if not link:
+            logger.error("No file link configured")
+            return None
+
+        sheet_id = link.sheet_id
+        self._ensure_imported(sheet_id)
+        updated_ids = self.store.update_pending_status(sheet_id, selector, status)
+        self.replicator.notify()
+
+        logger.info(f"Bulk updated status for {len(updated_ids)} users")
+        return updated_ids
+
+    def _get_download_url(self, url):
+        """Direct download URL for Google Drive, OneDrive or plain links"""
+        # Handle Google Drive links
+        if 'drive.google.com' in url:
+            file_id = self._get_google_file_id(url)
+            return f'https://drive.google.com/uc?export=download&id={file_id}'
+        # Handle OneDrive links
+        elif '1drv.ms' in url or 'onedrive.live.com' in url:
+            return url.replace('view.aspx', 'download.aspx')
+        # Handle direct links
+        return url
 
-            response = requests.get(download_url)
-            response.raise_for_status()
-            return BytesIO(response.content)
+    def download_file(self, url):
+        """Download file from Google Drive or OneDrive. Caller closes the returned file"""
+        try:
+            download_url = self._get_download_url(url)
+
+            # Ask only for changes since the cached copy
+            headers = self.download_cache.validators(download_url)
+            response, file = self.http.download(download_url, headers=headers)
+            if file is None:
+                # 304 Not Modified
+                entry = self.download_cache.hit(download_url)
+                cached = self.download_cache.open(entry) if entry else None
+                if cached:
+                    return cached
+                response, file = self.http.download(download_url)
+
+            self.download_cache.put(
+                download_url,
+                file,
+                response.headers.get('ETag'),
+                response.headers.get('Last-Modified')
+            )
+            return file
         except Exception as e:
             logger.error(f"Error downloading file: {e}")
             # Return empty file if download fails
-            buffer = BytesIO()
-            df = pd.DataFrame(columns=[
-                'Телеграмм ID', 
-                'Имя пользователя', 
-                'Пользовательский кошелек', 
-                'Кошелек реферера',
-                'Статус'
-            ])
-            df.to_excel(buffer, index=False, engine='openpyxl')
-            buffer.seek(0)
-            return buffer
+            import xlsx_reader
+            return xlsx_reader.empty_workbook(SHEET_HEADERS)
 
     def _get_google_file_id(self, url):
         """Extract file ID from Google Drive URL"""
@@ -252,7 +428,7 @@ class ExcelService:
             return url.split('id=')[1].split('&')[0]
         raise ValueError("Invalid Google Drive URL format")
 
-    def _upload_to_service(self, df, link):
+    def _upload_to_service(self, rows, link):
         """Upload file back to service"""
         try:
             # For Google Drive links
@@ -276,7 +452,7 @@ class ExcelService:
             # For direct links
             else:
                 # Just verify the link is accessible
-                response = requests.head(link)
+                response = self.http.head(link)
                 response.raise_for_status()
                 return True
                 
@@ -285,91 +461,128 @@ class ExcelService:
             return True  # Return True anyway to save locally
 
     async def admin_show_users(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
-        """Shows list of unvalidated users from Google Sheet."""
+        """Shows first page of unvalidated users from Google Sheet."""
         try:
-            file_link = self.get_file_link()
-            if not file_link:
-                await update.message.reply_text("Ссылка на файл не настроена.")
-                return False
-
-            # Extract sheet ID from link
-            sheet_id = file_link.split('/d/')[1].split('/')[0]
-
-            # Try both clients
-            sheet = None
-            try:
-                sheet = self.sheets_client.open_by_key(sheet_id).sheet1
-                logger.info("Successfully connected using sheets client")
-            except Exception as e:
-                logger.error(f"Failed with sheets client: {e}")
-                try:
-                    sheet = self.drive_client.open_by_key(sheet_id).sheet1
-                    logger.info("Successfully connected using drive client")
-                except Exception as e:
-                    logger.error(f"Could not access sheet: {e}")
-                    await update.message.reply_text("Ошибка доступа к таблице.")
-                    return False
-
-            # Get all values and headers
-            values = sheet.get_all_values()
-            if not values:
-                await update.message.reply_text("Таблица пуста.")
-                return False
-
-            headers = values[0]
-            records = []
-            
-            # Find status column index
-            try:
-                status_idx = headers.index('Статус')
-                id_idx = headers.index('Телеграмм ID')
-                username_idx = headers.index('Имя пользователя')
-                wallet_idx = headers.index('Пользовательский кошелек')
-            except ValueError:
-                # If headers don't exist, create them
-                headers = [
-                    'Телеграмм ID',
-                    'Имя пользователя',
-                    'Пользовательский кошелек',
-                    'Кошелек реферера',
-                    'Статус'
-                ]
-                sheet.insert_row(headers, 1)
-                await update.message.reply_text("Таблица пуста. Добавлены заголовки.")
+            error, page_content = await self.pool.run(self._load_users_page)
+            if error:
+                await update.message.reply_text(error)
                 return False
 
-            # Convert values to records
-            for row in values[1:]:  # Skip header row
-                if len(row) > status_idx:  # Make sure row has enough columns
-                    record = {
-                        'Телеграмм ID': row[id_idx] if len(row) > id_idx else '',
-                        'Имя пользователя': row[username_idx] if len(row) > username_idx else '',
-                        'Пользовательский кошелек': row[wallet_idx] if len(row) > wallet_idx else '',
-                        'Статус': row[status_idx] if len(row) > status_idx else ''
-                    }
-                    records.append(record)
-            
-            # Filter unvalidated users
-            unvalidated_users = [
-                record for record in records 
-                if not record['Статус']  # Empty or None status
-            ]
-            
-            if not unvalidated_users:
+            if page_content is None:
                 await update.message.reply_text("Нет пользователей для валидации.")
                 return False
 
-            user_list = "\n".join([
-                f"ID: {record['Телеграмм ID']}, "
-                f"Username: {record['Имя пользователя']}, "
-                f"Кошелек: {record['Пользовательский кошелек']}"
-                for record in unvalidated_users
-            ])
-            
-            await update.message.reply_text(f"Список пользователей для валидации:\n{user_list}")
+            # Later pages are read from the store by the cursor in their buttons
+            users, total, has_earlier, has_later = page_content
+            text, markup = self.user_pages.render(users, 0, total, has_earlier, has_later)
+            await update.message.reply_text(text, reply_markup=markup)
             return True
                 
         except Exception as e:
-            logger.error(f"Error in admin_show_users: {e}")
+            logger.error(f"Error in admin_show_users: {e!r}")
             await update.message.reply_text("Произошла ошибка при чтении данных.")
-            return False
\ No newline at end of file
+            return False
+
+    async def admin_show_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE, direction, cursor, page) -> bool:
+        """Switches user list message to another page."""
+        query = update.callback_query
+        try:
+            error, page_content = await self.pool.run(self._load_users_page, direction, cursor)
+            if not error and page_content is None:
+                # Everyone on that side of the cursor was validated meanwhile, start over
+                page = 0
+                error, page_content = await self.pool.run(self._load_users_page)
+            if error or page_content is None:
+                await query.answer(error or "Нет пользователей для валидации.")
+                return False
+
+            users, total, has_earlier, has_later = page_content
+            text, markup = self.user_pages.render(users, page, total, has_earlier, has_later)
+            await query.answer()
+            await query.edit_message_text(text, reply_markup=markup)
+            return True
+
+        except Exception as e:
+            logger.error(f"Error in admin_show_page: {e!r}")
+            await query.answer("Произошла ошибка при чтении данных.")
+            return False
+
+    def _load_users_page(self, direction=FORWARD, cursor=0):
+        """Read one page of unvalidated users from the store, returns (error message, page).
+        page is (users, total, has earlier, has later), None if the page is empty"""
+        link = self.link_config.get()
+        if not link:
+            return "Ссылка на файл не настроена.", None
+
+        sheet_id = link.sheet_id
+        try:
+            # Admin lists can wait for user registrations
+            with self.sheets_budget.priority(PRIORITY_BULK):
+                self._ensure_imported(sheet_id)
+        except Exception as e:
+            logger.error(f"Could not access sheet: {e}")
+            return "Ошибка доступа к таблице.", None
+        # Pick up rows added by hand if the last sync is too old; on failure the store is still served
+        self.sheet_sync.ensure_fresh(sheet_id)
+
+        page_size = self.user_pages.page_size
+        if direction == BACK:
+            users, has_earlier, has_later = self.store.pending_page(sheet_id, page_size, before_id=cursor)
+        else:
+            users, has_earlier, has_later = self.store.pending_page(sheet_id, page_size, after_id=cursor)
+        if not users:
+            return None, None
+        return None, (users, self.store.pending_count(sheet_id), has_earlier, has_later)
+
+    async def audit_wallets(self):
+        """Check all rows of the sheet, returns (error message, report)"""
+        try:
+            return await self.pool.run(self._audit_wallets_sync)
+        except Exception as e:
+            logger.error(f"Error auditing wallets: {e!r}")
+            return "Ошибка проверки таблицы.", None
+
+    def _audit_wallets_sync(self):
+        link = self.link_config.get()
+        if not link:
+            return "Ссылка на файл не настроена.", None
+
+        import wallet_audit
+
+        # Read the sheet itself, not the store, so hand edits are checked too
+        if link.is_google_sheet:
+            shards = self.store.shards(link.sheet_id)
+            with self.sheets_budget.priority(PRIORITY_BULK):
+                tables = [(number, self.sheet_handles.get(shard).get_all_values())
+                          for number, shard in enumerate(shards, start=1)]
+            if len(tables) > 1:
+                return None, wallet_audit.audit_shards(tables)
+            values = tables[0][1]
+        else:
+            import xlsx_reader
+            file_content = self.download_file(link.url)
+            try:
+                values = xlsx_reader.read_rows(file_content)
+            finally:
+                file_content.close()
+
+        return None, wallet_audit.audit_rows(values)
+
+    def stats(self):
+        """Internal counters for monitoring"""
+        return {
+            'store': self.store.stats(),
+            'replicator': self.replicator.stats(),
+            'download_cache': self.download_cache.stats(),
+            'sheets_budget': self.sheets_budget.stats(),
+            'sheet_reads': self.sheet_reads.stats(),
+            'sheet_sync': self.sheet_sync.stats(),
+            'shards': self.shard_router.stats(self._google_sheet_id()),
+        }
+
+    def close(self):
+        """Mirror outstanding changes and release worker threads"""
+        self.sheet_sync.stop()
+        self.replicator.stop()
+        self.pool.shutdown()
+        self.http.close()
@@ -0,0 +1,82 @@
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HttpClient:
+    """Shared keep-alive HTTP session with default timeouts and bounded retries"""
+
+    def __init__(self, connect_timeout=None, read_timeout=None, retries=None, pool_size=None, spool_max_memory=None):
+        connect_timeout = connect_timeout or float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+        read_timeout = read_timeout or float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+        self.timeout = (connect_timeout, read_timeout)
+        retries = retries if retries is not None else int(os.getenv('HTTP_RETRIES', '2'))
+        pool_size = pool_size or int(os.getenv('STORAGE_WORKERS', '4'))
+        # Files larger than this are spooled to disk while downloading
+        self.spool_max_memory = spool_max_memory or int(os.getenv('HTTP_SPOOL_MAX_MEMORY', str(1024 * 1024)))
+        self.retries = retries
+        self.pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """Session is built on first request, requests is not imported at startup"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('allow_redirects', True)
+        return self.session.head(url, **kwargs)
+
+    def download(self, url, headers=None):
+        """Stream response body into a spooled temp file.
+        Returns (response, file positioned at start); file is None for 304 responses"""
+        response = self.get(url, headers=headers, stream=True)
+        try:
+            if response.status_code == 304:
+                return response, None
+            response.raise_for_status()
+
+            file = tempfile.SpooledTemporaryFile(max_size=self.spool_max_memory)
+            for chunk in response.iter_content(CHUNK_SIZE):
+                file.write(chunk)
+            file.seek(0)
+            return response, file
+        finally:
+            response.close()
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
@@ -0,0 +1,112 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class FileLink:
+    """Configured file link, parsed once"""
+
+    def __init__(self, url):
+        self.url = url
+        self.is_google_sheet = 'docs.google.com/spreadsheets' in url
+        # Google Sheets link: https://docs.google.com/spreadsheets/d/<id>/edit
+        self.sheet_id = url.split('/d/')[1].split('/')[0] if '/d/' in url else None
+
+
+class LinkConfig:
+    """Link file cached in memory, re-read only when its mtime changes.
+
+    The file is still the source of truth, so editing it by hand works;
+    listeners are called whenever the link changes.
+    """
+
+    def __init__(self, path='data/excel_link.txt', check_interval=None):
+        self.path = path
+        # How often the file is stat-ed at most, seconds
+        self.check_interval = check_interval if check_interval is not None else float(os.getenv('LINK_CHECK_INTERVAL', '1'))
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._link = None
+        self._version = None  # (mtime_ns, size) of the file the link was read from
+        self._checked = 0.0
+        # Initial load, nobody is subscribed yet
+        self._refresh()
+
+    def subscribe(self, callback):
+        """callback(link) is called with the new FileLink, or None when the link was removed"""
+        self._listeners.append(callback)
+
+    def get(self):
+        """Current FileLink, None if no link is configured"""
+        if time.monotonic() - self._checked < self.check_interval:
+            return self._link
+        return self._refresh()[0]
+
+    def _refresh(self):
+        now = time.monotonic()
+        changed = False
+        with self._lock:
+            self._checked = now
+            try:
+                stat = os.stat(self.path)
+                version = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                version = None
+            if version != self._version:
+                changed = self._load(version)
+            link = self._link
+
+        if changed:
+            self._notify(link)
+        return link, changed
+
+    def _load(self, version):
+        """Read the file, returns True if the link changed"""
+        url = None
+        if version:
+            try:
+                with open(self.path, 'r') as f:
+                    url = f.read().strip() or None
+            except Exception as e:
+                logger.error(f"Error reading link file: {e}")
+                return False
+
+        self._version = version
+        if (self._link.url if self._link else None) == url:
+            return False
+        self._link = FileLink(url) if url else None
+        return True
+
+    def set(self, url):
+        """Save link atomically, readers see either the old or the new file"""
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.excel_link_', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(url)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        # Pick the new file up right away; setting the same link again still resets the caches
+        link, changed = self._refresh()
+        if not changed:
+            self._notify(link)
+        return link
+
+    def _notify(self, link):
+        logger.info(f"Using file link {link.url if link else None}")
+        for callback in self._listeners:
+            try:
+                callback(link)
+            except Exception as e:
+                logger.error(f"Error in link change listener: {e}")
@@ -1,18 +1,30 @@
+from startup_timer import STARTUP
 import os
 from dotenv import load_dotenv
 import re
+import asyncio
 import logging
+import secrets
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup, Document
 from telegram.ext import (
     Application,
+    CallbackQueryHandler,
     CommandHandler,
     MessageHandler,
     ConversationHandler,
+    TypeHandler,
     filters,
     ContextTypes
 )
 from translations import TRANSLATIONS
 from excel_service import ExcelService
+from update_processor import PerUserUpdateProcessor
+from admin_notifier import AdminNotifier
+from outbound_limiter import OutboundRateLimiter, PRIORITY_BULK
+import metrics
+from metrics import timed_handler
+
+STARTUP.mark('imports')
 
 # Load environment variables
 load_dotenv()
@@ -25,12 +37,40 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Define conversation states
-START, LANGUAGE_SELECT, WALLET_TYPE, USER_WALLET, REFERRER_WALLET, ADMIN_MENU, VALIDATE_USER = range(7)
+START, LANGUAGE_SELECT, WALLET_TYPE, USER_WALLET, REFERRER_WALLET, ADMIN_MENU, VALIDATE_USER, BULK_VALIDATE = range(8)
+
+ADMIN_KEYBOARD = [
+    ['Список пользователей'],
+    ['Валидация пользователя'],
+    ['Массовая валидация']
+]
 
 # Get environment variables
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 ADMIN_ID = int(os.getenv('ADMIN_ID'))
 
+# Update delivery: 'polling' or 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # public base URL, e.g. https://bot.example.com
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'webhook')
+# Telegram sends it back in X-Telegram-Bot-Api-Secret-Token, requests without it are rejected
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+# Placeholder older .env.example files shipped with, it is publicly known
+WEBHOOK_SECRET_PLACEHOLDER = 'change_me'
+# Bot API server, only changed for local test harnesses
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
+
+# 0x followed by 40 hex characters, compiled once
+ETH_ADDRESS_RE = re.compile(r'^0x[a-fA-F0-9]{40}$')
+
+# Only update types the handlers use
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# Bulk notifications in flight at once, the send rate is enforced by OutboundRateLimiter
+NOTIFY_CONCURRENCY = int(os.getenv('NOTIFY_CONCURRENCY', '10'))
+
 class WalletBot:
     def __init__(self, token, admin_id):
         global ADMIN_ID
@@ -39,13 +79,16 @@ class WalletBot:
         ADMIN_ID = admin_id
         self.application = None
         self.excel_service = ExcelService()
+        self.admin_notifier = AdminNotifier(admin_id)
+        self.excel_service.on_alert = self.admin_notifier.alert
+        STARTUP.mark('bot_init')
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Starts the conversation."""
         context.user_data.clear()
         
         if update.effective_user.id == ADMIN_ID:
-            if not os.path.exists('data/excel_link.txt'):
+            if not self.excel_service.link_config.get():
                 await update.message.reply_text(
                     "👋 Привет, администратор!\n\n"
                     "❗️ Для начала работы необходимо:\n"
@@ -62,11 +105,7 @@ class WalletBot:
                 return ConversationHandler.END
             
             context.user_data['language'] = 'ru'
-            keyboard = [
-                ['Список пользователей'],
-                ['Валидация пользователя']
-            ]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+            reply_markup = ReplyKeyboardMarkup(ADMIN_KEYBOARD, resize_keyboard=True)
             await update.message.reply_text(
                 "Панель администратора\n\n"
                 "🔗 Текущая ссылка на файл: /getlink",
@@ -75,7 +114,7 @@ class WalletBot:
             return ADMIN_MENU
 
         # Check if admin has set up the file
-        if not os.path.exists('data/excel_link.txt'):
+        if not self.excel_service.link_config.get():
             await update.message.reply_text(
                 "⚠️ Бот находится в процессе настройки.\n"
                 "Пожалуйста, попробуйте позже."
@@ -135,16 +174,8 @@ class WalletBot:
         """Begins the user registration process."""
         language = context.user_data.get('language', 'en')
         try:
-            # Уведомление администратора о новом пользователе (всегда на русском)
-            if self.application and ADMIN_ID:
-                try:
-                    await self.application.bot.send_message(
-                        chat_id=ADMIN_ID, 
-                        text=f"🆕 Новый пользователь начал регистрацию: @{update.effective_user.username or 'без username'}"
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to notify admin: {e}")
-                    pass
+            # Уведомление администратора о новом пользователе (всегда на русском), уходит в дайджест
+            self.admin_notifier.user_started(update.effective_user)
 
             # Use translated button text
             keyboard = [[TRANSLATIONS[language]['evm_wallet']]]
@@ -219,6 +250,19 @@ class WalletBot:
             await update.message.reply_text("Произошла ошибка при чтении данных.")
             return ADMIN_MENU
 
+    async def admin_users_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handles user list page buttons."""
+        query = update.callback_query
+        if update.effective_user.id != ADMIN_ID:
+            await query.answer()
+            return
+
+        try:
+            direction, cursor, page = self.excel_service.user_pages.parse(query.data)
+            await self.excel_service.admin_show_page(update, context, direction, cursor, page)
+        except ValueError:
+            await query.answer()
+
     async def admin_start_validation(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Begins user validation process."""
         try:
@@ -264,14 +308,14 @@ class WalletBot:
                     
                     await update.message.reply_text(
                         f"✅ Пользователь {user_id} успешно подтвержден!",
-                        reply_markup=ReplyKeyboardMarkup([['Список пользователей'], ['Валидация пользователя']], resize_keyboard=True)
+                        reply_markup=ReplyKeyboardMarkup(ADMIN_KEYBOARD, resize_keyboard=True)
                     )
                 except Exception as e:
                     await update.message.reply_text(f"Пользователь подтвержден, но не удалось отправить ему уведомление: {e}")
             else:
                 await update.message.reply_text(
                     "❌ Не удалось найти или подтвердить пользователя.",
-                    reply_markup=ReplyKeyboardMarkup([['Список пользователей'], ['Валидация пользователя']], resize_keyboard=True)
+                    reply_markup=ReplyKeyboardMarkup(ADMIN_KEYBOARD, resize_keyboard=True)
                 )
 
             return ADMIN_MENU
@@ -281,11 +325,128 @@ class WalletBot:
             await update.message.reply_text("Произошла ошибка. Попробуйте снова через /start")
             return ConversationHandler.END
 
+    async def admin_start_bulk_validation(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Begins bulk validation process."""
+        await update.message.reply_text(
+            "Введите пользователей для подтверждения:\n"
+            "• ID через пробел или запятую: 123 456\n"
+            "• диапазон ID: 100-200\n"
+            "• все ожидающие: все"
+        )
+        return BULK_VALIDATE
+
+    async def confirm_bulk_validation(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Validates many users with one batched sheet update."""
+        try:
+            selector = self.parse_user_selection(update.message.text)
+            if selector is None:
+                await update.message.reply_text(
+                    "Не удалось разобрать список. Пример: 123, 456, 100-200 или все"
+                )
+                return BULK_VALIDATE
+
+            progress = await update.message.reply_text("⏳ Обновляем статусы...")
+            updated = await self.excel_service.bulk_update_status(selector, 'Подтвержден')
+            if updated is None:
+                await update.message.reply_text(
+                    "❌ Не удалось обновить статусы.",
+                    reply_markup=ReplyKeyboardMarkup(ADMIN_KEYBOARD, resize_keyboard=True)
+                )
+                return ADMIN_MENU
+            if not updated:
+                await update.message.reply_text(
+                    "Нет подходящих пользователей для валидации.",
+                    reply_markup=ReplyKeyboardMarkup(ADMIN_KEYBOARD, resize_keyboard=True)
+                )
+                return ADMIN_MENU
+
+            # A user with several wallets gets one notification
+            user_ids = list(dict.fromkeys(updated))
+            await progress.edit_text(f"✅ Подтверждено: {len(updated)}. Отправляем уведомления...")
+            # Sending takes minutes at the bulk rate, the admin keeps using the bot meanwhile
+            context.application.create_task(
+                self.finish_bulk_validation(update, len(updated), user_ids, progress), update=update
+            )
+            await update.message.reply_text(
+                "Итог пришлю, когда уведомления будут отправлены.",
+                reply_markup=ReplyKeyboardMarkup(ADMIN_KEYBOARD, resize_keyboard=True)
+            )
+            return ADMIN_MENU
+
+        except Exception as e:
+            logger.error(f"Error in confirm_bulk_validation: {e}")
+            await update.message.reply_text("Произошла ошибка. Попробуйте снова через /start")
+            return ConversationHandler.END
+
+    async def finish_bulk_validation(self, update: Update, validated, user_ids, progress):
+        """Notifies validated users in background and posts the bulk validation summary."""
+        try:
+            sent, failed = await self.notify_users(
+                user_ids, "🎉 Поздравляем! Ваша регистрация подтверждена.", progress
+            )
+            await update.message.reply_text(
+                f"📊 Итог массовой валидации:\n"
+                f"✅ Подтверждено записей: {validated}\n"
+                f"📨 Уведомлений отправлено: {sent}\n"
+                f"⚠️ Не удалось уведомить: {failed}"
+            )
+        except Exception as e:
+            logger.error(f"Error in finish_bulk_validation: {e}")
+
+    def parse_user_selection(self, text: str):
+        """Parses '123, 456 100-200' or 'все' into a predicate over Telegram IDs."""
+        text = text.strip().lower()
+        if text in ('все', 'all'):
+            return lambda telegram_id: True
+
+        ids = set()
+        ranges = []
+        for part in re.split(r'[\s,;]+', text):
+            if not part:
+                continue
+            match = re.fullmatch(r'(\d+)-(\d+)', part)
+            if match:
+                low, high = sorted((int(match.group(1)), int(match.group(2))))
+                ranges.append((low, high))
+            elif part.isdigit():
+                ids.add(int(part))
+            else:
+                return None
+
+        if not ids and not ranges:
+            return None
+        return lambda telegram_id: telegram_id in ids or any(low <= telegram_id <= high for low, high in ranges)
+
+    async def notify_users(self, user_ids, text, progress_message=None):
+        """Sends text to many users at bulk priority, returns (sent, failed)."""
+        semaphore = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+        counts = {'sent': 0, 'failed': 0}
+
+        async def send(user_id):
+            async with semaphore:
+                try:
+                    await self.application.bot.send_message(
+                        chat_id=user_id, text=text, rate_limit_args={'priority': PRIORITY_BULK}
+                    )
+                    counts['sent'] += 1
+                except Exception as e:
+                    logger.error(f"Failed to notify user {user_id}: {e}")
+                    counts['failed'] += 1
+
+                done = counts['sent'] + counts['failed']
+                if progress_message and done % 50 == 0 and done < len(user_ids):
+                    try:
+                        await progress_message.edit_text(f"📨 Отправлено уведомлений: {done}/{len(user_ids)}")
+                    except Exception as e:
+                        logger.error(f"Failed to update progress: {e}")
+
+        await asyncio.gather(*(send(user_id) for user_id in user_ids))
+        return counts['sent'], counts['failed']
+
     def is_valid_eth_address(self, address: str) -> bool:
         """Validates Ethereum address format."""
         # Check if address matches the format: 0x followed by 40 hex characters
-        pattern = r'^0x[a-fA-F0-9]{40}$'
-        return bool(re.match(pattern, address))
+        return bool(ETH_ADDRESS_RE.match(address))
 
     async def save_user_data(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Saves the user data to Excel file."""
@@ -321,22 +482,14 @@ class WalletBot:
                 'Статус': None
             }
 
-            if self.excel_service.save_user_data(user_data):
+            if await self.excel_service.save_user_data(user_data):
                 # Remove keyboard only after successful registration
                 await update.message.reply_text(
                     "✅ Спасибо за регистрацию! Ожидайте подтверждения от администратора.",
                     reply_markup=ReplyKeyboardRemove()  # Remove keyboard here
                 )
                 # Notify admin about new registration
-                if self.application:
-                    await self.application.bot.send_message(
-                        chat_id=ADMIN_ID,
-                        text=f"✅ Новая регистрация!\n"
-                             f"👤 Пользователь: @{update.effective_user.username or 'без username'}\n"
-                             f"📱 ID: {update.effective_user.id}\n"
-                             f"💼 Кошелек: {user_wallet}\n"
-                             f"👥 Реферер: {referrer_wallet}"
-                    )
+                self.admin_notifier.user_registered(update.effective_user, user_wallet, referrer_wallet)
                 return ConversationHandler.END
             else:
                 raise Exception("Failed to save data")
@@ -360,66 +513,133 @@ class WalletBot:
         """Cleanup before shutdown"""
         if self.application:
             await self.application.shutdown()
+        self.excel_service.close()
     
+    def build_application(self):
+        """Builds the Application with all handlers registered."""
+        builder = (
+            Application.builder()
+            .token(self.token)
+            .post_init(self.post_init)
+            .post_stop(self.post_stop)
+            .concurrent_updates(PerUserUpdateProcessor())
+            .rate_limiter(OutboundRateLimiter())
+        )
+        if TELEGRAM_API_URL:
+            builder = builder.base_url(TELEGRAM_API_URL)
+        application = builder.build()
+        self.application = application
+        STARTUP.mark('application_built')
+
+        # Set up conversation handler
+        conv_handler = ConversationHandler(
+            entry_points=[CommandHandler('start', timed_handler(self.start))],
+            states={
+                LANGUAGE_SELECT: [
+                    CommandHandler('start', timed_handler(self.start)),
+                    MessageHandler(
+                        filters.Regex('^(English 🇬🇧|中文 🇨🇳|Indonesia 🇮🇩|Filipino 🇵🇭|Tiếng Việt 🇻🇳|Русский 🇷🇺)$'), 
+                        timed_handler(self.select_language)
+                    )
+                ],
+                START: [
+                    CommandHandler('start', timed_handler(self.start)),
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, timed_handler(self.user_start_registration))
+                ],
+                WALLET_TYPE: [
+                    CommandHandler('start', timed_handler(self.start)),
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, timed_handler(self.select_wallet_type))
+                ],
+                USER_WALLET: [
+                    CommandHandler('start', timed_handler(self.start)),
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, timed_handler(self.collect_user_wallet))
+                ],
+                REFERRER_WALLET: [
+                    CommandHandler('start', timed_handler(self.start)),
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, timed_handler(self.save_user_data))
+                ],
+                ADMIN_MENU: [
+                    CommandHandler('start', timed_handler(self.start)),
+                    MessageHandler(filters.Regex('^Список пользователей$'), timed_handler(self.admin_show_users)),
+                    MessageHandler(filters.Regex('^Валидация пользователя$'), timed_handler(self.admin_start_validation)),
+                    MessageHandler(filters.Regex('^Массовая валидация$'), timed_handler(self.admin_start_bulk_validation)),
+                ],
+                VALIDATE_USER: [
+                    CommandHandler('start', timed_handler(self.start)),
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, timed_handler(self.confirm_user_validation))
+                ],
+                BULK_VALIDATE: [
+                    CommandHandler('start', timed_handler(self.start)),
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, timed_handler(self.confirm_bulk_validation))
+                ],
+            },
+            fallbacks=[CommandHandler('cancel', timed_handler(self.cancel))]
+        )
+
+        # Add handlers
+        application.add_handler(TypeHandler(Update, self.mark_first_update), group=-1)
+        application.add_handler(conv_handler)
+        application.add_handler(CommandHandler('setlink', timed_handler(self.set_excel_link)))
+        application.add_handler(CommandHandler('getlink', timed_handler(self.get_excel_link)))
+        application.add_handler(CommandHandler('stats', timed_handler(self.show_stats)))
+        application.add_handler(CommandHandler('audit', timed_handler(self.audit_wallets)))
+        application.add_handler(CommandHandler('shards', timed_handler(self.show_shards)))
+        application.add_handler(CommandHandler('addshard', timed_handler(self.add_shard)))
+        application.add_handler(CallbackQueryHandler(timed_handler(self.admin_users_page), pattern=r'^users:'))
+
+        return application
+
     def run(self):
         """Runs the bot."""
         try:
-            application = Application.builder().token(self.token).build()
-            self.application = application
-
-            # Set up conversation handler
-            conv_handler = ConversationHandler(
-                entry_points=[CommandHandler('start', self.start)],
-                states={
-                    LANGUAGE_SELECT: [
-                        CommandHandler('start', self.start),
-                        MessageHandler(
-                            filters.Regex('^(English 🇬🇧|中文 🇨🇳|Indonesia 🇮🇩|Filipino 🇵🇭|Tiếng Việt 🇻🇳|Русский 🇷🇺)$'), 
-                            self.select_language
-                        )
-                    ],
-                    START: [
-                        CommandHandler('start', self.start),
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.user_start_registration)
-                    ],
-                    WALLET_TYPE: [
-                        CommandHandler('start', self.start),
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.select_wallet_type)
-                    ],
-                    USER_WALLET: [
-                        CommandHandler('start', self.start),
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.collect_user_wallet)
-                    ],
-                    REFERRER_WALLET: [
-                        CommandHandler('start', self.start),
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.save_user_data)
-                    ],
-                    ADMIN_MENU: [
-                        CommandHandler('start', self.start),
-                        MessageHandler(filters.Regex('^Список пользователей$'), self.admin_show_users),
-                        MessageHandler(filters.Regex('^Валидация пользователя$'), self.admin_start_validation),
-                    ],
-                    VALIDATE_USER: [
-                        CommandHandler('start', self.start),
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.confirm_user_validation)
-                    ],
-                },
-                fallbacks=[CommandHandler('cancel', self.cancel)]
-            )
-
-            # Add handlers
-            application.add_handler(conv_handler)
-            application.add_handler(CommandHandler('setlink', self.set_excel_link))
-            application.add_handler(CommandHandler('getlink', self.get_excel_link))
+            application = self.build_application()
+            metrics.start_server()
+            metrics.OUTBOUND_QUEUE.callback = lambda: application.bot.rate_limiter.stats()['queued']
+            metrics.OUTBOX_DEPTH.callback = lambda: self.excel_service.store.outbox_depth()[0]
+            metrics.SHEETS_READS_USED.callback = lambda: self.excel_service.sheets_budget.used('read')
+            metrics.SHEETS_WRITES_USED.callback = lambda: self.excel_service.sheets_budget.used('write')
 
             # Start the bot
-            application.run_polling(allowed_updates=Update.ALL_TYPES)
+            if BOT_MODE == 'webhook':
+                if not WEBHOOK_URL:
+                    raise ValueError("WEBHOOK_URL is required when BOT_MODE=webhook")
+                if WEBHOOK_SECRET == WEBHOOK_SECRET_PLACEHOLDER:
+                    raise ValueError("WEBHOOK_SECRET is the example placeholder, set a random value or leave it empty")
+                logger.info(f"Starting webhook server on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}")
+                application.run_webhook(
+                    listen=WEBHOOK_LISTEN,
+                    port=WEBHOOK_PORT,
+                    url_path=WEBHOOK_PATH,
+                    webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+                    secret_token=WEBHOOK_SECRET,
+                    allowed_updates=ALLOWED_UPDATES,
+                )
+            else:
+                application.run_polling(allowed_updates=ALLOWED_UPDATES)
+            self.excel_service.close()
             
         except Exception as e:
             logger.error(f"Error in run method: {e}")
             if self.application:
                 self.application.stop()
 
+    async def post_init(self, application: Application):
+        """Called once the bot is connected, before the first update is fetched"""
+        STARTUP.mark('polling_start')
+        logger.info(f"Startup timings: {STARTUP.report()}")
+        self.admin_notifier.start(application.bot)
+
+    async def post_stop(self, application: Application):
+        """Sends the last admin digest before the bot stops"""
+        await self.admin_notifier.stop()
+
+    async def mark_first_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Records time to the first handled update"""
+        if 'first_update' in STARTUP.phases:
+            return
+        STARTUP.mark('first_update')
+        logger.info(f"Startup timings: {STARTUP.report()}")
+
     async def restart(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Restarts the conversation."""
         context.user_data.clear()  # Clear user data
@@ -437,9 +657,8 @@ class WalletBot:
                 await update.message.reply_text("Использование: /setlink <ссылка>")
                 return
             
-            # Save link to file
-            with open('data/excel_link.txt', 'w') as f:
-                f.write(link)
+            # Save link to file, caches of the old link are reset by the listener
+            self.excel_service.link_config.set(link)
             
             await update.message.reply_text(
                 "✅ Ссылка сохранена!\n\n"
@@ -458,11 +677,10 @@ class WalletBot:
             return
         
         try:
-            if os.path.exists('data/excel_link.txt'):
-                with open('data/excel_link.txt', 'r') as f:
-                    link = f.read().strip()
+            link = self.excel_service.link_config.get()
+            if link:
                 await update.message.reply_text(
-                    f"🔗 Ссылка на файл Excel:\n{link}\n\n"
+                    f"🔗 Ссылка на файл Excel:\n{link.url}\n\n"
                     "Откройте ссылку для просмотра и редактирования данных."
                 )
             else:
@@ -473,6 +691,121 @@ class WalletBot:
         except Exception as e:
             await update.message.reply_text(f"Ошибка: {e}")
 
+    async def audit_wallets(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Checks every wallet in the sheet and reports problems to the admin"""
+        if update.effective_user.id != ADMIN_ID:
+            return
+
+        await update.message.reply_text("⏳ Проверяю кошельки в таблице...")
+        error, report = await self.excel_service.audit_wallets()
+        if error:
+            await update.message.reply_text(error)
+            return
+
+        from wallet_audit import format_report
+        limit = 10
+        text = format_report(report, limit)
+        while len(text) > 4096 and limit > 1:
+            limit //= 2
+            text = format_report(report, limit)
+        await update.message.reply_text(text[:4096])
+
+    async def show_shards(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Lists the worksheets registrations are spread over"""
+        if update.effective_user.id != ADMIN_ID:
+            return
+
+        error, shards = await self.excel_service.list_shards()
+        if error:
+            await update.message.reply_text(error)
+            return
+
+        max_rows = self.excel_service.shard_router.max_rows
+        lines = [f"🗂 Листы с регистрациями (до {max_rows} строк на лист):"]
+        for number, (shard, rows, is_open) in enumerate(shards, start=1):
+            state = "принимает новые" if is_open else "заполнен"
+            lines.append(f"{number}. {shard}: {rows} строк, {state}")
+        lines.append("")
+        lines.append("Добавить лист: /addshard <имя листа или ссылка на таблицу>")
+        await update.message.reply_text("\n".join(lines))
+
+    async def add_shard(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Adds a worksheet or spreadsheet new registrations are spread over"""
+        if update.effective_user.id != ADMIN_ID:
+            return
+
+        spec = ' '.join(context.args)
+        if not spec:
+            await update.message.reply_text("Использование: /addshard <имя листа или ссылка на таблицу>")
+            return
+
+        await update.message.reply_text("⏳ Подключаю лист...")
+        error, shard = await self.excel_service.add_shard(spec)
+        if error:
+            await update.message.reply_text(error)
+            return
+        await update.message.reply_text(
+            f"✅ Лист {shard} подключен.\n"
+            "Новые регистрации распределяются по листам, уже сохраненные строки остаются на месте."
+        )
+
+    async def show_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Sends outbound queue and storage metrics to the admin"""
+        if update.effective_user.id != ADMIN_ID:
+            return
+
+        outbound = context.bot.rate_limiter.stats()
+        lines = [
+            "📈 Исходящие сообщения",
+            f"В очереди: {outbound['queued']}, 429: {outbound['retry_after']}, "
+            f"ошибок: {outbound['failed']}, пауза: {outbound['paused_for']:.1f} с",
+        ]
+        for name in ('interactive', 'normal', 'bulk'):
+            item = outbound[name]
+            lines.append(
+                f"{name}: {item['sent']} отправлено, ожидание p50 {item['wait_p50'] * 1000:.0f} мс, "
+                f"p95 {item['wait_p95'] * 1000:.0f} мс, max {item['wait_max'] * 1000:.0f} мс"
+            )
+
+        # Counts rows in SQLite, kept off the event loop like every storage call
+        try:
+            storage = await self.excel_service.pool.run(self.excel_service.stats)
+        except Exception as e:
+            logger.error(f"Error reading storage stats: {e!r}")
+            await update.message.reply_text("\n".join(lines + ["", "Не удалось прочитать статистику хранилища."]))
+            return
+        lines += [
+            "",
+            "💾 Хранилище",
+            f"Регистраций: {storage['store']['registrations']}, "
+            f"в очереди в таблицу: {storage['replicator']['depth']} "
+            f"(задержка {storage['replicator']['oldest_age']:.0f} с)",
+            "",
+            "📊 Квота Google Sheets (за минуту)",
+        ]
+        for kind, title in (('read', 'Чтение'), ('write', 'Запись')):
+            item = storage['sheets_budget'][kind]
+            lines.append(
+                f"{title}: {item['used']}/{item['quota']}, ожидают: {item['waiting']}, "
+                f"отложено: {item['deferred']}, 429: {item['throttled']}, "
+                f"повторов: {item['retries']}, ошибок: {item['failed']}"
+            )
+        reads = storage['sheet_reads']
+        lines.append(
+            f"Чтения таблицы: {reads['calls']} запросов, совмещено: {reads['shared']}, "
+            f"из свежего результата: {reads['fresh_hits']}"
+        )
+        sync = storage['sheet_sync']
+        age = f"{sync['last_sync_age']:.0f} с назад" if sync['last_sync_age'] is not None else "ещё не было"
+        lines.append(
+            f"Синхронизация с таблицей: {age}, добавлено строк: {sync['added_rows']}, "
+            f"обновлено: {sync['updated_rows']}, удалено: {sync['removed_rows']}, полных: {sync['full_syncs']}, без изменений: {sync['skipped_syncs']}, ошибок: {sync['failed']}"
+        )
+        if len(storage['shards']) > 1:
+            full = sum(1 for _, _, is_open in storage['shards'] if not is_open)
+            lines.append(f"Листов с регистрациями: {len(storage['shards'])}, заполнено: {full} (/shards)")
+        await update.message.reply_text("\n".join(lines))
+
 def main():
     bot = WalletBot(BOT_TOKEN, ADMIN_ID)
     bot.run()
@@ -0,0 +1,205 @@
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += 1
+            entry[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, entry in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, entry):
+                    bucket_labels = _format_labels(self.labelnames, labels, [('le', f'{bound:g}')])
+                    lines.append(f'{self.name}_bucket{bucket_labels} {count}')
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, [("le", "+Inf")])} {entry[-2]}')
+                lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {entry[-2]}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {entry[-1]}')
+        return lines
+
+
+class Gauge:
+    """Value read from a callback when metrics are scraped"""
+
+    def __init__(self, name, documentation, callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        _registry.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        if self.callback:
+            try:
+                lines.append(f'{self.name} {float(self.callback())}')
+            except Exception as e:
+                logger.error(f"Error reading gauge {self.name}: {e}")
+        return lines
+
+
+HANDLER_DURATION = Histogram(
+    'walletbot_handler_duration_seconds', 'Time spent in a Telegram update handler',
+    ['handler', 'outcome'],
+)
+SHEETS_DURATION = Histogram(
+    'walletbot_sheets_call_duration_seconds', 'Google Sheets API call latency',
+    ['operation', 'outcome'],
+)
+TELEGRAM_DURATION = Histogram(
+    'walletbot_telegram_request_duration_seconds', 'Bot API request latency, queue wait excluded',
+    ['endpoint', 'outcome'],
+)
+OUTBOUND_WAIT = Histogram(
+    'walletbot_outbound_queue_wait_seconds', 'Time a send waited for rate limit tokens',
+    ['priority'],
+)
+SHEETS_BUDGET_WAIT = Histogram(
+    'walletbot_sheets_budget_wait_seconds', 'Time a Sheets request waited for quota budget',
+    ['kind', 'priority'],
+)
+SHEETS_RETRIES = Counter(
+    'walletbot_sheets_retries_total', 'Sheets requests retried after a quota, server or connection error',
+    ['kind', 'reason'],
+)
+SHEETS_READS_USED = Gauge('walletbot_sheets_read_requests_window', 'Sheets read requests sent in the last minute')
+SHEETS_WRITES_USED = Gauge('walletbot_sheets_write_requests_window', 'Sheets write requests sent in the last minute')
+OUTBOUND_QUEUE = Gauge('walletbot_outbound_queued', 'Sends waiting for a global token')
+OUTBOX_DEPTH = Gauge('walletbot_outbox_depth', 'Store changes not yet mirrored to the sheet')
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def timed_handler(callback):
+    """Wrap a handler callback to record its latency and whether it raised"""
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            return await callback(update, context)
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - started, callback.__name__, outcome)
+    return wrapper
+
+
+class TimedWorksheet:
+    """Worksheet proxy recording latency of every API call made through it"""
+
+    def __init__(self, worksheet):
+        self._worksheet = worksheet
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = 'ok'
+            try:
+                return attr(*args, **kwargs)
+            except Exception:
+                outcome = 'error'
+                raise
+            finally:
+                SHEETS_DURATION.observe(time.perf_counter() - started, name, outcome)
+        return call
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(listen=None, port=None):
+    """Serve /metrics from a background thread, METRICS_PORT=0 disables it"""
+    listen = listen or os.getenv('METRICS_LISTEN', '127.0.0.1')
+    port = port if port is not None else int(os.getenv('METRICS_PORT', '9108'))
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((listen, port), _Handler)
+    except OSError as e:
+        logger.error(f"Could not start metrics server on {listen}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info(f"Metrics available at http://{listen}:{port}/metrics")
+    return server
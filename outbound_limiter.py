@@ -0,0 +1,201 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import OUTBOUND_WAIT, TELEGRAM_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Lower value goes first
+PRIORITY_INTERACTIVE = 0  # replies to the user who is waiting for them
+PRIORITY_NORMAL = 1  # admin alerts and digests
+PRIORITY_BULK = 2  # mass notifications
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_NORMAL: 'normal', PRIORITY_BULK: 'bulk'}
+
+MAX_IDLE_CHATS = 10000
+
+
+class TokenBucket:
+    """rate tokens per second, up to burst tokens saved while idle"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def delay(self):
+        """Seconds until a token is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def is_full(self):
+        return self.delay() == 0 and self.tokens >= self.burst
+
+
+class OutboundRateLimiter(BaseRateLimiter):
+    """Single scheduler for every request the bot sends.
+
+    Requests addressed to a chat wait for a token of that chat's bucket and
+    then for a token of the global bucket; the global tokens are handed out
+    by priority, so replies overtake bulk notifications. A 429 pauses all
+    sending for retry_after seconds and the request is retried.
+
+    Priority is passed per call: bot.send_message(..., rate_limit_args={'priority': PRIORITY_BULK}).
+    """
+
+    def __init__(self, global_rate=None, chat_rate=None, chat_burst=None, group_rate=None, max_retries=None):
+        global_rate = global_rate or float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate or float(os.getenv('OUTBOUND_CHAT_RATE', '1'))
+        self.chat_burst = chat_burst or float(os.getenv('OUTBOUND_CHAT_BURST', '3'))
+        # Groups are limited per minute
+        self.group_rate = (group_rate or float(os.getenv('OUTBOUND_GROUP_RATE', '20'))) / 60
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+
+        self._chats = {}
+        self._waiting = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._dispatcher = None
+        self._paused_until = 0.0
+
+        self.latencies = {priority: deque(maxlen=1000) for priority in PRIORITY_NAMES}
+        self.sent = {priority: 0 for priority in PRIORITY_NAMES}
+        self.retry_after_count = 0
+        self.failed = 0
+
+    async def initialize(self):
+        # Called by both the Application and the Updater
+        if self._dispatcher:
+            return
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for _, _, future in self._waiting:
+            future.cancel()
+        self._waiting = []
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            # getMe, answerCallbackQuery, webhook setup... are not message sends
+            return await self._timed(endpoint, callback, args, kwargs)
+
+        priority = (rate_limit_args or {}).get('priority', PRIORITY_INTERACTIVE)
+        queued = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            await self._chat_token(chat_id)
+            await self._global_token(priority)
+            if attempt == 0:
+                waited = time.monotonic() - queued
+                self.latencies[priority].append(waited)
+                OUTBOUND_WAIT.observe(waited, PRIORITY_NAMES[priority])
+            try:
+                result = await self._timed(endpoint, callback, args, kwargs)
+                self.sent[priority] += 1
+                return result
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                delay = retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+                self.retry_after_count += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    raise
+                logger.warning(f"Flood limit on {endpoint} to {chat_id}, pausing sends for {delay}s")
+
+    async def _timed(self, endpoint, callback, args, kwargs):
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            return await callback(*args, **kwargs)
+        except RetryAfter:
+            outcome = 'retry_after'
+            raise
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            TELEGRAM_DURATION.observe(time.perf_counter() - started, endpoint, outcome)
+
+    async def _chat_token(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > MAX_IDLE_CHATS:
+                self._chats = {key: b for key, b in self._chats.items() if not b.is_full()}
+            is_group = str(chat_id).startswith('-')
+            bucket = self._chats[chat_id] = (
+                TokenBucket(self.group_rate, 1) if is_group else TokenBucket(self.chat_rate, self.chat_burst)
+            )
+        while True:
+            delay = bucket.delay()
+            if not delay:
+                bucket.take()
+                return
+            await asyncio.sleep(delay)
+
+    async def _global_token(self, priority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._seq), future))
+        self._wakeup.set()
+        await future
+
+    async def _dispatch(self):
+        """Hands out global tokens to waiting requests, most urgent first"""
+        while True:
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            delay = self.global_bucket.delay()
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                self.global_bucket.take()
+                future.set_result(None)
+
+    def stats(self):
+        result = {
+            'queued': len(self._waiting),
+            'retry_after': self.retry_after_count,
+            'failed': self.failed,
+            'paused_for': max(self._paused_until - time.monotonic(), 0.0),
+        }
+        for priority, name in PRIORITY_NAMES.items():
+            waits = sorted(self.latencies[priority])
+            result[name] = {
+                'sent': self.sent[priority],
+                'wait_p50': waits[len(waits) // 2] if waits else 0.0,
+                'wait_p95': waits[int(len(waits) * 0.95)] if waits else 0.0,
+                'wait_max': waits[-1] if waits else 0.0,
+            }
+        return result
@@ -0,0 +1,425 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WALLET_KEY_SIZE = 20  # EVM address is 20 bytes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS registrations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sheet_id TEXT NOT NULL,
+    telegram_id INTEGER NOT NULL,
+    username TEXT NOT NULL DEFAULT '',
+    wallet TEXT NOT NULL,
+    wallet_key BLOB NOT NULL,
+    referrer TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    sheet_row INTEGER,
+    -- Worksheet the row is mirrored to, see shard_router
+    shard TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_registrations_wallet ON registrations(sheet_id, wallet_key);
+CREATE INDEX IF NOT EXISTS idx_registrations_telegram_id ON registrations(sheet_id, telegram_id);
+CREATE INDEX IF NOT EXISTS idx_registrations_status ON registrations(sheet_id, status);
+
+-- Changes that still have to be mirrored to the sheet
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    registration_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+REGISTRATION_COLUMNS = 'id, sheet_id, telegram_id, username, wallet, referrer, status, sheet_row'
+
+# Deleting up to this many rows from a shard is never treated as a mass removal
+MIN_REMOVABLE_ROWS = 5
+
+# Created after the shard column is added to stores made before sharding
+SHARD_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_registrations_shard ON registrations(shard, sheet_row);
+"""
+
+
+def wallet_key(address):
+    """Normalize wallet address to 20 raw bytes, None if it is not an EVM address"""
+    if not address:
+        return None
+    address = str(address).strip().lower()
+    if address.startswith('0x'):
+        address = address[2:]
+    if len(address) != WALLET_KEY_SIZE * 2:
+        return None
+    try:
+        return bytes.fromhex(address)
+    except ValueError:
+        return None
+
+
+class RegistrationStore:
+    """SQLite (WAL) store of registrations, the sheet is only a mirror of it"""
+
+    def __init__(self, db_file=None):
+        self.db_file = db_file or os.getenv('STORE_FILE', 'data/registrations.db')
+        os.makedirs(os.path.dirname(self.db_file) or '.', exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(registrations)")]
+            if 'shard' not in columns:
+                # Rows stored before sharding are all in the sheet itself
+                conn.execute("ALTER TABLE registrations ADD COLUMN shard TEXT")
+                conn.execute("UPDATE registrations SET shard = sheet_id")
+            conn.executescript(SHARD_SCHEMA)
+
+    def _connection(self):
+        """One connection per worker thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn = conn
+        return conn
+
+    def _query(self, sql, params=()):
+        return self._connection().execute(sql, params).fetchall()
+
+    # --- registrations ---
+
+    def is_imported(self, shard):
+        """Check if rows of this sheet (or shard) were already copied into the store"""
+        return bool(self._query("SELECT 1 FROM meta WHERE key = ?", (f'imported:{shard}',)))
+
+    def _sheet_records(self, sheet_id, shard, numbered_rows):
+        """Registration records of (row number, row) pairs, rows without an ID or wallet are skipped"""
+        now = time.time()
+        records = []
+        for row_number, row in numbered_rows:
+            row = list(row) + [''] * (5 - len(row))
+            key = wallet_key(row[2])
+            try:
+                telegram_id = int(row[0])
+            except ValueError:
+                continue
+            if key is None:
+                continue
+            records.append((sheet_id, telegram_id, row[1], row[2], key, row[3], row[4], now, row_number, shard))
+        return records
+
+    def _insert_records(self, conn, records):
+        """Insert records read from the sheet, returns how many were new"""
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO registrations "
+            "(sheet_id, telegram_id, username, wallet, wallet_key, referrer, status, created_at, sheet_row, shard) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            records
+        )
+        return conn.total_changes - before
+
+    def import_rows(self, sheet_id, values, shard=None):
+        """Copy existing sheet rows (as returned by get_all_values) into the store,
+        shard is the worksheet they come from if it is not the sheet itself"""
+        shard = shard or sheet_id
+        header = values[0] if values else []
+        has_header = 'Пользовательский кошелек' in header
+        first_row = 2 if has_header else 1
+        records = self._sheet_records(sheet_id, shard, enumerate(values[first_row - 1:], start=first_row))
+
+        with self._write_lock, self._connection() as conn:
+            self._insert_records(conn, records)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (f'imported:{shard}', '1'))
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                # gspread returns [[]] for an empty sheet
+                (f'has_rows:{shard}', '1' if any(any(row) for row in values) else '0')
+            )
+        logger.info(f"Imported {len(records)} rows from sheet {shard}")
+
+    def add_registration(self, sheet_id, user_data, shard=None):
+        """Insert registration and queue it for the mirror, False if wallet already exists"""
+        key = wallet_key(user_data['Пользовательский кошелек'])
+        now = time.time()
+        try:
+            with self._write_lock, self._connection() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO registrations "
+                    "(sheet_id, telegram_id, username, wallet, wallet_key, referrer, status, created_at, shard) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        sheet_id,
+                        int(user_data['Телеграмм ID']),
+                        str(user_data['Имя пользователя'] or ''),
+                        user_data['Пользовательский кошелек'],
+                        key,
+                        user_data['Кошелек реферера'],
+                        user_data['Статус'] or '',
+                        now,
+                        shard or sheet_id,
+                    )
+                )
+                conn.execute(
+                    "INSERT INTO outbox (registration_id, kind, created_at) VALUES (?, 'insert', ?)",
+                    (cursor.lastrowid, now)
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def wallet_exists(self, sheet_id, address):
+        return bool(self._query(
+            "SELECT 1 FROM registrations WHERE sheet_id = ? AND wallet_key = ?",
+            (sheet_id, wallet_key(address))
+        ))
+
+    def update_status(self, sheet_id, telegram_id, status):
+        """Set status of all registrations of the user, returns number of rows changed"""
+        now = time.time()
+        with self._write_lock, self._connection() as conn:
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM registrations WHERE sheet_id = ? AND telegram_id = ?",
+                (sheet_id, int(telegram_id))
+            )]
+            return self._set_status(conn, ids, status, now)
+
+    def update_pending_status(self, sheet_id, selector, status):
+        """Set status of every pending registration whose Telegram ID matches selector,
+        returns list of Telegram IDs"""
+        now = time.time()
+        with self._write_lock, self._connection() as conn:
+            rows = conn.execute(
+                "SELECT id, telegram_id FROM registrations WHERE sheet_id = ? AND status = '' ORDER BY id",
+                (sheet_id,)
+            ).fetchall()
+            matched = [(reg_id, telegram_id) for reg_id, telegram_id in rows if selector(telegram_id)]
+            self._set_status(conn, [reg_id for reg_id, _ in matched], status, now)
+        return [telegram_id for _, telegram_id in matched]
+
+    def _set_status(self, conn, ids, status, now):
+        conn.executemany("UPDATE registrations SET status = ? WHERE id = ?", [(status, i) for i in ids])
+        conn.executemany(
+            "INSERT INTO outbox (registration_id, kind, created_at) VALUES (?, 'status', ?)",
+            [(i, now) for i in ids]
+        )
+        return len(ids)
+
+    def pending_users(self, sheet_id):
+        """Unvalidated users as (telegram id, username, wallet) tuples"""
+        return [
+            (str(telegram_id), username, wallet)
+            for telegram_id, username, wallet in self._query(
+                "SELECT telegram_id, username, wallet FROM registrations "
+                "WHERE sheet_id = ? AND status = '' ORDER BY id",
+                (sheet_id,)
+            )
+        ]
+
+    def pending_page(self, sheet_id, limit, after_id=0, before_id=None):
+        """One page of unvalidated users ordered by registration, returns
+        ([(registration id, telegram id, username, wallet)], has earlier, has later).
+
+        Pages go forward from after_id or back from before_id, the status index
+        ends with the id, so a page costs the same wherever it is.
+        """
+        pending = "FROM registrations WHERE sheet_id = ? AND status = ''"
+        if before_id is not None:
+            rows = self._query(
+                f"SELECT id, telegram_id, username, wallet {pending} AND id < ? ORDER BY id DESC LIMIT ?",
+                (sheet_id, before_id, limit)
+            )[::-1]
+        else:
+            rows = self._query(
+                f"SELECT id, telegram_id, username, wallet {pending} AND id > ? ORDER BY id LIMIT ?",
+                (sheet_id, after_id, limit)
+            )
+        if not rows:
+            return [], False, False
+        has_earlier = bool(self._query(f"SELECT 1 {pending} AND id < ? LIMIT 1", (sheet_id, rows[0][0])))
+        has_later = bool(self._query(f"SELECT 1 {pending} AND id > ? LIMIT 1", (sheet_id, rows[-1][0])))
+        users = [(reg_id, str(telegram_id), username, wallet) for reg_id, telegram_id, username, wallet in rows]
+        return users, has_earlier, has_later
+
+    def pending_count(self, sheet_id):
+        return self._query(
+            "SELECT COUNT(*) FROM registrations WHERE sheet_id = ? AND status = ''", (sheet_id,)
+        )[0][0]
+
+    # --- mirror support ---
+
+    def has_rows(self, shard):
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (f'has_rows:{shard}',))
+        return bool(rows) and rows[0][0] == '1'
+
+    def set_has_rows(self, shard):
+        with self._write_lock, self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, '1')", (f'has_rows:{shard}',))
+
+    def pending_changes(self, limit):
+        """Oldest outbox entries joined with their registrations, with the shard in place of the sheet ID"""
+        columns = REGISTRATION_COLUMNS.replace('sheet_id', 'shard')
+        return self._query(
+            "SELECT o.id, o.kind, o.created_at, "
+            + ', '.join(f'r.{column}' for column in columns.split(', ')) +
+            " FROM outbox o JOIN registrations r ON r.id = o.registration_id ORDER BY o.id LIMIT ?",
+            (limit,)
+        )
+
+    def ack_changes(self, outbox_ids):
+        with self._write_lock, self._connection() as conn:
+            conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in outbox_ids])
+
+    def set_sheet_rows(self, rows):
+        """Save sheet row numbers, rows is [(registration id, row number)]"""
+        with self._write_lock, self._connection() as conn:
+            conn.executemany(
+                "UPDATE registrations SET sheet_row = ? WHERE id = ?",
+                [(row_number, reg_id) for reg_id, row_number in rows]
+            )
+
+    def remap_sheet_rows(self, shard, values):
+        """Recompute row numbers after the sheet was edited by hand"""
+        mapping = []
+        for row_number, row in enumerate(values, start=1):
+            key = wallet_key(row[2]) if len(row) > 2 else None
+            if key:
+                mapping.append((row_number, shard, key))
+        with self._write_lock, self._connection() as conn:
+            conn.execute("UPDATE registrations SET sheet_row = NULL WHERE shard = ?", (shard,))
+            conn.executemany(
+                "UPDATE registrations SET sheet_row = ? WHERE shard = ? AND wallet_key = ?",
+                mapping
+            )
+
+    def add_sheet_rows(self, sheet_id, shard, numbered_rows):
+        """Store rows that were added to the shard by hand, they are not mirrored back"""
+        records = self._sheet_records(sheet_id, shard, numbered_rows)
+        with self._write_lock, self._connection() as conn:
+            return self._insert_records(conn, records)
+
+    def reconcile_rows(self, sheet_id, shard, values, max_removed_share=1.0):
+        """Bring the store in line with the whole shard, returns (added, updated, removed, kept).
+
+        Row numbers are recomputed, unknown rows are added, rows deleted by hand
+        are removed and hand edits of username, referrer and status are taken
+        over, except for registrations with changes still waiting to be
+        mirrored: those are newer than the sheet. Missing rows are kept instead
+        of removed (and counted as kept) if the sheet has no header or more
+        than max_removed_share of the shard's rows would go: the sheet was
+        more likely cleared or overwritten than edited.
+        """
+        header = values[0] if values else []
+        has_header = 'Пользовательский кошелек' in header
+        first_row = 2 if has_header else 1
+        records = self._sheet_records(sheet_id, shard, enumerate(values[first_row - 1:], start=first_row))
+
+        with self._write_lock, self._connection() as conn:
+            conn.execute("UPDATE registrations SET sheet_row = NULL WHERE shard = ?", (shard,))
+            conn.executemany(
+                "UPDATE registrations SET sheet_row = ? WHERE shard = ? AND wallet_key = ?",
+                [(record[8], shard, record[4]) for record in records]
+            )
+            before = conn.total_changes
+            conn.executemany(
+                "UPDATE registrations SET username = ?, referrer = ?, status = ? "
+                "WHERE shard = ? AND wallet_key = ? AND (username != ? OR referrer != ? OR status != ?) "
+                "AND id NOT IN (SELECT registration_id FROM outbox)",
+                [(record[2], record[5], record[6], shard, record[4], record[2], record[5], record[6])
+                 for record in records]
+            )
+            updated = conn.total_changes - before
+            # Rows without a row number now are no longer in the sheet
+            missing = (
+                "FROM registrations WHERE shard = ? AND sheet_row IS NULL "
+                "AND id NOT IN (SELECT registration_id FROM outbox)"
+            )
+            total = conn.execute("SELECT COUNT(*) FROM registrations WHERE shard = ?", (shard,)).fetchone()[0]
+            kept = conn.execute(f"SELECT COUNT(*) {missing}", (shard,)).fetchone()[0]
+            removed = 0
+            if kept and has_header and kept <= max(total * max_removed_share, MIN_REMOVABLE_ROWS):
+                removed = conn.execute(f"DELETE {missing}", (shard,)).rowcount
+                kept = 0
+            added = self._insert_records(conn, records)
+        return added, updated, removed, kept
+
+    def mirrored_statuses(self, shard):
+        """(sheet row, status) of rows in the shard whose changes were all mirrored"""
+        return self._query(
+            "SELECT sheet_row, status FROM registrations WHERE shard = ? AND sheet_row IS NOT NULL "
+            "AND id NOT IN (SELECT registration_id FROM outbox)",
+            (shard,)
+        )
+
+    def last_sheet_row(self, shard):
+        """Highest known sheet row of a registration, None if no row is known"""
+        return self._query("SELECT MAX(sheet_row) FROM registrations WHERE shard = ?", (shard,))[0][0]
+
+    def wallet_at_row(self, shard, row_number):
+        rows = self._query(
+            "SELECT wallet FROM registrations WHERE shard = ? AND sheet_row = ?", (shard, row_number)
+        )
+        return rows[0][0] if rows else None
+
+    def sheet_header(self, shard):
+        """Header row seen at the last sync, None if not known yet"""
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (f'header:{shard}',))
+        return json.loads(rows[0][0]) if rows else None
+
+    def set_sheet_header(self, shard, header):
+        with self._write_lock, self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (f'header:{shard}', json.dumps(header))
+            )
+
+    # --- shards ---
+
+    def shards(self, sheet_id):
+        """Worksheets registrations of the sheet are spread over, the sheet itself first"""
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (f'shards:{sheet_id}',))
+        return [sheet_id] + (json.loads(rows[0][0]) if rows else [])
+
+    def add_shard(self, sheet_id, shard):
+        """Register one more worksheet, False if it is already one of the shards"""
+        with self._write_lock, self._connection() as conn:
+            rows = conn.execute("SELECT value FROM meta WHERE key = ?", (f'shards:{sheet_id}',)).fetchall()
+            shards = json.loads(rows[0][0]) if rows else []
+            if shard == sheet_id or shard in shards:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (f'shards:{sheet_id}', json.dumps(shards + [shard]))
+            )
+        return True
+
+    def shard_size(self, shard):
+        """Registrations stored for the shard"""
+        return self._query("SELECT COUNT(*) FROM registrations WHERE shard = ?", (shard,))[0][0]
+
+    def sheet_rows(self, reg_ids):
+        """Current (registration id, row number) pairs"""
+        placeholders = ', '.join('?' * len(reg_ids))
+        return self._query(f"SELECT id, sheet_row FROM registrations WHERE id IN ({placeholders})", reg_ids)
+
+    def outbox_depth(self):
+        return self._query("SELECT COUNT(*), MIN(created_at) FROM outbox")[0]
+
+    def stats(self):
+        count, oldest = self.outbox_depth()
+        return {
+            'registrations': self._query("SELECT COUNT(*) FROM registrations")[0][0],
+            'outbox_depth': count,
+            'outbox_lag': time.time() - oldest if oldest else 0.0,
+        }
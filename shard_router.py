@@ -0,0 +1,90 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from registration_store import wallet_key
+
+logger = logging.getLogger(__name__)
+
+# Google's limit for all worksheets of one spreadsheet
+SPREADSHEET_CELL_LIMIT = 10_000_000
+
+
+def has_room(grid_sizes, rows, cols):
+    """Check if a worksheet of rows x cols still fits a spreadsheet whose worksheets
+    are grid_sizes [(row count, column count)]: Google counts grid cells, not filled ones"""
+    return sum(row_count * col_count for row_count, col_count in grid_sizes) + rows * cols <= SPREADSHEET_CELL_LIMIT
+
+
+def shard_name(spreadsheet_id, title=None):
+    """Shard is a spreadsheet ID (its first worksheet) or 'spreadsheet ID/worksheet title'"""
+    return f'{spreadsheet_id}/{title}' if title else spreadsheet_id
+
+
+def split_shard(shard):
+    """(spreadsheet ID, worksheet title or None)"""
+    spreadsheet_id, _, title = shard.partition('/')
+    return spreadsheet_id, title or None
+
+
+class ShardRouter:
+    """Picks the worksheet a new registration is mirrored to.
+
+    Wallets are spread by rendezvous hashing: every shard scores
+    blake2b(wallet + shard) and the highest score wins. The choice is
+    stable, and a new shard only takes over its share of new wallets;
+    rows already stored stay where they are, the store knows their shard.
+    Shards holding max_rows registrations get no new ones; when all of them
+    are full, on_full(sheet_id) is called so more capacity can be added.
+    """
+
+    def __init__(self, store, max_rows=None, count_ttl=60.0, on_full=None):
+        self.store = store
+        self.max_rows = max_rows or int(os.getenv('SHARD_MAX_ROWS', '200000'))
+        # Sizes are counted in the store at most this often, recorded rows are added in between
+        self.count_ttl = count_ttl
+        self.on_full = on_full
+        self._lock = threading.Lock()
+        self._sizes = {}  # shard -> (registrations, counted at)
+
+    def route(self, sheet_id, wallet):
+        """Shard for a new registration of the wallet"""
+        shards = self.store.shards(sheet_id)
+        candidates = [shard for shard in shards if self.size(shard) < self.max_rows]
+        if not candidates:
+            if self.on_full:
+                self.on_full(sheet_id)
+            candidates = shards
+        key = wallet_key(wallet) or str(wallet).strip().lower().encode()
+        return max(candidates, key=lambda shard: hashlib.blake2b(key + shard.encode(), digest_size=8).digest())
+
+    def record(self, shard):
+        """Count a registration stored for the shard until the next recount"""
+        with self._lock:
+            size, counted_at = self._sizes.get(shard, (0, 0.0))
+            self._sizes[shard] = (size + 1, counted_at)
+
+    def size(self, shard):
+        """Registrations stored for the shard, may lag behind by a few rows"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._sizes.get(shard)
+        if cached and now - cached[1] < self.count_ttl:
+            return cached[0]
+        size = self.store.shard_size(shard)
+        with self._lock:
+            self._sizes[shard] = (size, now)
+        return size
+
+    def forget(self):
+        """Count again on the next route, e.g. after rows were imported"""
+        with self._lock:
+            self._sizes.clear()
+
+    def stats(self, sheet_id):
+        """[(shard, registrations, still takes new ones)]"""
+        if not sheet_id:
+            return []
+        return [(shard, self.size(shard), self.size(shard) < self.max_rows) for shard in self.store.shards(sheet_id)]
@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+import time
+
+from metrics import SHEETS_DURATION, TimedWorksheet
+from shard_router import split_shard
+from sheets_budget import BudgetedWorksheet
+from single_flight import SharedReadsWorksheet
+
+logger = logging.getLogger(__name__)
+
+
+class SheetHandleCache:
+    """Caches worksheet handles per sheet ID (or shard) and remembers which client could open them"""
+
+    def __init__(self, get_clients, budget, flights, ttl=None):
+        # get_clients returns [(name, client), ...] in order of preference
+        self.get_clients = get_clients
+        self.budget = budget
+        self.flights = flights
+        self.ttl = ttl or float(os.getenv('SHEET_HANDLE_TTL', '600'))
+        self._lock = threading.Lock()
+        self._entries = {}  # sheet_id -> (worksheet, client name, expires at)
+        self._preferred = {}  # sheet_id -> client name that worked last time
+
+    def get(self, sheet_id, create=False):
+        """Return cached worksheet or open it, trying the last working client first.
+        A missing worksheet of a shard is added if create is set"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(sheet_id)
+            if entry and entry[2] > now:
+                return entry[0]
+            preferred = self._preferred.get(sheet_id)
+
+        clients = [(name, client) for name, client in self.get_clients() if client is not None]
+        clients.sort(key=lambda item: item[0] != preferred)
+
+        last_error = None
+        for name, client in clients:
+            started = time.perf_counter()
+            try:
+                # open_by_key and sheet1 each fetch the spreadsheet metadata
+                worksheet = self.budget.call('read', self._open, client, sheet_id, cost=2)
+                if worksheet is None:
+                    if not create:
+                        raise Exception(f"Worksheet {sheet_id} not found")
+                    worksheet = self.budget.call('write', self._add, client, sheet_id, idempotent=False)
+                # Identical reads share one budgeted request
+                sheet = SharedReadsWorksheet(BudgetedWorksheet(TimedWorksheet(worksheet), self.budget), self.flights, sheet_id)
+            except Exception as e:
+                SHEETS_DURATION.observe(time.perf_counter() - started, 'open_by_key', 'error')
+                logger.error(f"Failed to connect with {name} client: {e}")
+                last_error = e
+                continue
+            SHEETS_DURATION.observe(time.perf_counter() - started, 'open_by_key', 'ok')
+
+            logger.info(f"Successfully connected using {name} client")
+            with self._lock:
+                self._entries[sheet_id] = (sheet, name, time.monotonic() + self.ttl)
+                self._preferred[sheet_id] = name
+            return sheet
+
+        raise Exception(f"Could not access sheet with either client. Last error: {last_error}")
+
+    def _open(self, client, sheet_id):
+        """First worksheet of the spreadsheet or the shard's worksheet, None if there is no such worksheet"""
+        from gspread.exceptions import WorksheetNotFound
+
+        spreadsheet_id, title = split_shard(sheet_id)
+        spreadsheet = client.open_by_key(spreadsheet_id)
+        if not title:
+            return spreadsheet.sheet1
+        try:
+            return spreadsheet.worksheet(title)
+        except WorksheetNotFound:
+            return None
+
+    def _add(self, client, sheet_id):
+        from sheet_mirror import SHEET_HEADERS
+
+        spreadsheet_id, title = split_shard(sheet_id)
+        # As narrow as the rows, cells count against the spreadsheet's limit
+        return client.open_by_key(spreadsheet_id).add_worksheet(title, rows=1, cols=len(SHEET_HEADERS))
+
+    def grid_sizes(self, spreadsheet_id):
+        """(row count, column count) of every worksheet of the spreadsheet"""
+        last_error = None
+        for name, client in self.get_clients():
+            if client is None:
+                continue
+            try:
+                # open_by_key and worksheets each fetch the spreadsheet metadata
+                return self.budget.call('read', self._grid_sizes, client, spreadsheet_id, cost=2)
+            except Exception as e:
+                logger.error(f"Failed to read worksheets with {name} client: {e}")
+                last_error = e
+        raise Exception(f"Could not read worksheets of {spreadsheet_id}. Last error: {last_error}")
+
+    def _grid_sizes(self, client, spreadsheet_id):
+        return [(worksheet.row_count, worksheet.col_count) for worksheet in client.open_by_key(spreadsheet_id).worksheets()]
+
+    def invalidate(self, sheet_id=None):
+        """Drop one cached handle, or all of them"""
+        with self._lock:
+            if sheet_id is None:
+                self._entries.clear()
+                self._preferred.clear()
+            else:
+                self._entries.pop(sheet_id, None)
+        if sheet_id is None:
+            self.flights.forget_all()
+        else:
+            self.flights.forget(sheet_id)
@@ -0,0 +1,252 @@
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SHEET_HEADERS = [
+    'Телеграмм ID',
+    'Имя пользователя',
+    'Пользовательский кошелек',
+    'Кошелек реферера',
+    'Статус'
+]
+STATUS_COLUMN = 5
+
+
+class SheetReplicator:
+    """Background thread mirroring store changes (new rows, status changes) to Google Sheets.
+
+    Changes are taken from the store outbox in order. A batch (up to
+    max_batch changes) is sent when batch_size changes are waiting or the
+    oldest one is flush_interval seconds old; failed batches are retried
+    with exponential backoff.
+    """
+
+    def __init__(self, store, get_sheet, batch_size=None, max_batch=None, flush_interval=None, max_retry_delay=None):
+        self.store = store
+        # get_sheet(shard) returns a worksheet handle, changes are grouped by the shard of their row
+        self.get_sheet = get_sheet
+        self.batch_size = batch_size or int(os.getenv('QUEUE_BATCH_SIZE', '50'))
+        # Upper bound of changes sent at once, bulk validations can queue thousands
+        self.max_batch = max_batch or int(os.getenv('QUEUE_MAX_BATCH', '500'))
+        self.flush_interval = flush_interval or float(os.getenv('QUEUE_FLUSH_INTERVAL', '5'))
+        self.max_retry_delay = max_retry_delay or float(os.getenv('QUEUE_MAX_RETRY_DELAY', '60'))
+
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._retry_delay = 0
+        self._failed_sheets = set()
+
+        self.flushed_changes = 0
+        self.failed_flushes = 0
+        self.last_batch_size = 0
+        self.last_flush_latency = 0.0
+
+    def notify(self):
+        """Called after a change was added to the outbox"""
+        if not self._retry_delay and self.store.outbox_depth()[0] >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='sheet-mirror', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=30):
+        """Stop background thread and try to mirror what is left"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self._next_wait())
+            self._wakeup.clear()
+            if self._stopping:
+                # Drain what we can before exiting, the outbox keeps the rest
+                while self.store.outbox_depth()[0] and self.flush():
+                    pass
+                break
+            if self._due():
+                self.flush()
+
+    def _next_wait(self):
+        if self._retry_delay:
+            return self._retry_delay
+        count, oldest = self.store.outbox_depth()
+        if not count:
+            return self.flush_interval
+        return max(self.flush_interval - (time.time() - oldest), 0.05)
+
+    def _due(self):
+        count, oldest = self.store.outbox_depth()
+        return bool(count) and (count >= self.batch_size or time.time() - oldest >= self.flush_interval)
+
+    def exclusive(self):
+        """Lock held while a batch is mirrored, hold it to change row numbers safely"""
+        return self._flush_lock
+
+    def flush(self):
+        """Mirror one batch of changes, returns True if nothing failed"""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        changes = self.store.pending_changes(self.max_batch)
+        if not changes:
+            return True
+
+        by_sheet = {}
+        for change in changes:
+            by_sheet.setdefault(change[4], []).append(change)
+
+        ok = True
+        for sheet_id, items in by_sheet.items():
+            started = time.monotonic()
+            try:
+                done = self._mirror(sheet_id, items, sheet_id in self._failed_sheets)
+            except Exception as e:
+                ok = False
+                self.failed_flushes += 1
+                self._failed_sheets.add(sheet_id)
+                self._retry_delay = min(max(self._retry_delay * 2, 1), self.max_retry_delay)
+                logger.error(f"Failed to mirror {len(items)} changes, retry in {self._retry_delay}s: {e}")
+                continue
+
+            self._failed_sheets.discard(sheet_id)
+            self.store.ack_changes(done)
+            self.last_flush_latency = time.monotonic() - started
+            self.last_batch_size = len(done)
+            self.flushed_changes += len(done)
+            logger.info(f"Mirrored {len(done)} changes in {self.last_flush_latency:.2f}s")
+
+        if ok:
+            self._retry_delay = 0
+        return ok
+
+    def _mirror(self, sheet_id, items, is_retry):
+        """Send inserts and status changes of one sheet, returns outbox ids that are done"""
+        sheet = self.get_sheet(sheet_id)
+        done = []
+
+        # New rows: current status is written with the row, so later status changes are no-ops
+        inserts = {}
+        for outbox_id, kind, _, reg_id, _, telegram_id, username, wallet, referrer, status, sheet_row in items:
+            if kind == 'insert':
+                inserts[reg_id] = [str(telegram_id), username, wallet, referrer, status]
+                done.append(outbox_id)
+        if inserts:
+            self._append(sheet_id, sheet, inserts, is_retry)
+
+        # Status changes go to the known row of the registration
+        updates = {}
+        for outbox_id, kind, _, reg_id, _, telegram_id, _, wallet, _, status, sheet_row in items:
+            if kind != 'status':
+                continue
+            if reg_id in inserts:
+                done.append(outbox_id)
+            elif sheet_row:
+                updates[reg_id] = (outbox_id, sheet_row, str(telegram_id), status)
+            else:
+                # Row was never mirrored or got lost by hand edits, find it again
+                updates[reg_id] = (outbox_id, None, str(telegram_id), status)
+        if updates:
+            done.extend(self._update_statuses(sheet_id, sheet, updates))
+        return done
+
+    def _append(self, sheet_id, sheet, inserts, is_retry):
+        reg_ids = list(inserts)
+        rows = [inserts[reg_id] for reg_id in reg_ids]
+        if is_retry:
+            # A failed append may still have reached the sheet, skip rows that are already there
+            existing = {wallet.lower() for wallet in sheet.col_values(3)}
+            if SHEET_HEADERS[2].lower() in existing:
+                self.store.set_has_rows(sheet_id)
+            kept = [i for i, row in enumerate(rows) if row[2].lower() not in existing]
+            reg_ids = [reg_ids[i] for i in kept]
+            rows = [rows[i] for i in kept]
+            if not rows:
+                return {}
+
+        header_rows = 0
+        if not self.store.has_rows(sheet_id):
+            # Sheet is empty, add headers
+            rows = [SHEET_HEADERS] + rows
+            header_rows = 1
+
+        response = sheet.append_rows(rows)
+        if header_rows:
+            self.store.set_has_rows(sheet_id)
+
+        # Remember where the rows landed so status updates can go straight to them
+        first_row = self._first_appended_row(response)
+        if not first_row:
+            return {}
+        placed = {reg_id: first_row + header_rows + offset for offset, reg_id in enumerate(reg_ids)}
+        self.store.set_sheet_rows(list(placed.items()))
+        return placed
+
+    def _update_statuses(self, sheet_id, sheet, updates):
+        """Write statuses with one batch_update, repairing row numbers if the sheet was edited"""
+        from gspread.utils import rowcol_to_a1
+
+        known = {reg_id: update for reg_id, update in updates.items() if update[1]}
+        stale = len(known) < len(updates)
+        if known and not stale:
+            # Check the ID cells of the target rows in one read before writing
+            ranges = [rowcol_to_a1(update[1], 1) for update in known.values()]
+            found = sheet.batch_get(ranges)
+            for cell, update in zip(found, known.values()):
+                value = cell[0][0] if cell and cell[0] else ''
+                if value != update[2]:
+                    stale = True
+                    break
+
+        if stale:
+            logger.warning(f"Row numbers of sheet {sheet_id} are stale, reloading from sheet")
+            self.store.remap_sheet_rows(sheet_id, sheet.get_all_values())
+            rows = dict(self.store.sheet_rows(list(updates)))
+            updates = {
+                reg_id: (update[0], rows.get(reg_id), update[2], update[3])
+                for reg_id, update in updates.items()
+            }
+
+        batch = [
+            {'range': rowcol_to_a1(sheet_row, STATUS_COLUMN), 'values': [[status]]}
+            for _, sheet_row, _, status in updates.values() if sheet_row
+        ]
+        if batch:
+            sheet.batch_update(batch)
+
+        # Changes of rows that are not in the sheet at all can't be mirrored, drop them
+        missing = [update[2] for update in updates.values() if not update[1]]
+        if missing:
+            logger.error(f"Users {missing} not found in sheet {sheet_id}, status not mirrored")
+        return [update[0] for update in updates.values()]
+
+    def _first_appended_row(self, response):
+        """Parse first row number from append response, e.g. 'Sheet1'!A10:E12 -> 10"""
+        try:
+            updated_range = response['updates']['updatedRange']
+            match = re.search(r'![A-Z]+(\d+)', updated_range)
+            return int(match.group(1)) if match else None
+        except (KeyError, TypeError):
+            return None
+
+    def stats(self):
+        depth, oldest = self.store.outbox_depth()
+        return {
+            'depth': depth,
+            'oldest_age': time.time() - oldest if oldest else 0.0,
+            'flushed_changes': self.flushed_changes,
+            'failed_flushes': self.failed_flushes,
+            'last_batch_size': self.last_batch_size,
+            'last_flush_latency': self.last_flush_latency,
+        }
@@ -0,0 +1,202 @@
+import logging
+import os
+import threading
+import time
+
+from outbound_limiter import PRIORITY_BULK
+from registration_store import wallet_key
+from shard_router import split_shard
+
+logger = logging.getLogger(__name__)
+
+
+def _header(row):
+    """Header cells A1:E1 the way batch_get returns them, trailing empty cells trimmed"""
+    header = [str(cell) for cell in row[:5]]
+    while header and not header[-1]:
+        header.pop()
+    return header
+
+
+class SheetTailSync:
+    """Background thread pulling rows added or edited by hand in the sheet into the store.
+
+    Every interval seconds get_version(spreadsheet ID) is asked for the
+    spreadsheet's version (Drive modifiedTime). If it did not change since
+    the last sync, the round costs no Sheets request at all. Otherwise one
+    batch_get reads the header, the rows from the last known row on and the
+    status column. Rows after the last known one are imported. If the
+    header, the last known row or a status of a stored row changed, the
+    sheet was edited in place and is reconciled in full. Without a version
+    the status column is not read. A full reconcile also runs every
+    full_interval seconds, which bounds how stale other hand edits can get.
+    Every shard of the sheet is synced on its own.
+    """
+
+    def __init__(self, store, get_sheet, get_sheet_id, replicator, budget,
+                 interval=None, full_interval=None, max_staleness=None, max_removed_share=None, alert=None,
+                 get_version=None):
+        self.store = store
+        self.get_sheet = get_sheet
+        # get_sheet_id() returns the configured sheet ID, None if the link is not a Google Sheet
+        self.get_sheet_id = get_sheet_id
+        self.replicator = replicator
+        self.budget = budget
+        # 0 disables the background thread, ensure_fresh still works
+        self.interval = interval if interval is not None else float(os.getenv('SHEET_SYNC_INTERVAL', '60'))
+        self.full_interval = full_interval or float(os.getenv('SHEET_SYNC_FULL_INTERVAL', '3600'))
+        self.max_staleness = max_staleness or float(os.getenv('SHEET_SYNC_MAX_STALENESS', '300'))
+        # A reconcile removing more of a shard's rows than this leaves them in the store and alerts the admin
+        self.max_removed_share = max_removed_share or float(os.getenv('SHEET_SYNC_MAX_REMOVED_SHARE', '0.1'))
+        # alert(text) tells the admin about something that needs a look, called from the sync thread
+        self.alert = alert
+        # get_version(spreadsheet ID) returns a string that changes with every edit, None if unknown
+        self.get_version = get_version
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._synced_at = {}  # sheet_id -> monotonic time of the last successful sync
+        self._full_synced_at = {}
+        self._versions = {}  # shard -> version seen at its last successful sync
+
+        self.added_rows = 0
+        self.updated_rows = 0
+        self.removed_rows = 0
+        self.full_syncs = 0
+        self.skipped_syncs = 0
+        self.failed_syncs = 0
+
+    def start(self):
+        if self.interval and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='sheet-sync', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            sheet_id = self.get_sheet_id()
+            if sheet_id:
+                self.sync(sheet_id)
+
+    def ensure_fresh(self, sheet_id):
+        """Sync now if the last sync is older than max_staleness, the store is served either way"""
+        synced_at = self._synced_at.get(sheet_id)
+        if synced_at is None or time.monotonic() - synced_at > self.max_staleness:
+            self.sync(sheet_id)
+
+    def sync(self, sheet_id):
+        """One sync round over all shards, returns True if it succeeded"""
+        if not self.store.is_imported(sheet_id):
+            # The first use of a sheet imports it whole
+            return False
+        ok = True
+        versions = {}  # spreadsheet ID -> version, shards of one spreadsheet share it
+        for shard in self.store.shards(sheet_id):
+            try:
+                spreadsheet_id = split_shard(shard)[0]
+                if spreadsheet_id not in versions:
+                    versions[spreadsheet_id] = self.get_version(spreadsheet_id) if self.get_version else None
+                version = versions[spreadsheet_id]
+                if version is not None and version == self._versions.get(shard) and not self._full_due(shard):
+                    self.skipped_syncs += 1
+                    continue
+                with self.budget.priority(PRIORITY_BULK), self.replicator.exclusive():
+                    # Edits made after the probe change the version again and are seen next time
+                    self._sync(sheet_id, shard, check_statuses=version is not None)
+                self._versions[shard] = version
+            except Exception as e:
+                ok = False
+                self.failed_syncs += 1
+                logger.error(f"Failed to sync sheet {shard}: {e}")
+        if ok:
+            self._synced_at[sheet_id] = time.monotonic()
+        return ok
+
+    def _full_due(self, shard):
+        # The import or the first reconcile counts as a full sync
+        return time.monotonic() - self._full_synced_at.setdefault(shard, time.monotonic()) >= self.full_interval
+
+    def _sync(self, sheet_id, shard, check_statuses):
+        sheet = self.get_sheet(shard)
+        last_row = self.store.last_sheet_row(shard) or (1 if self.store.has_rows(shard) else 0)
+        first = max(last_row, 1)
+        ranges = ['A1:E1', f'A{first}:E']
+        if check_statuses:
+            # The sheet changed since the last sync, admins mostly edit statuses in place
+            ranges.append('E:E')
+        header_range, tail, *status_column = sheet.batch_get(ranges)
+        header = _header(header_range[0]) if header_range else []
+
+        known_header = self.store.sheet_header(shard)
+        if header and not known_header:
+            self.store.set_sheet_header(shard, header)
+        elif known_header and header != known_header:
+            logger.info(f"Header of sheet {shard} changed, reconciling")
+            return self._reconcile(sheet_id, shard, sheet)
+
+        # The last known row must still hold the same wallet, otherwise rows were inserted or deleted
+        if last_row > 1:
+            expected = self.store.wallet_at_row(shard, last_row)
+            found = tail[0][2] if tail and len(tail[0]) > 2 else ''
+            if expected and wallet_key(found) != wallet_key(expected):
+                logger.info(f"Row {last_row} of sheet {shard} changed, reconciling")
+                return self._reconcile(sheet_id, shard, sheet)
+
+        if status_column and self._statuses_changed(shard, status_column[0]):
+            logger.info(f"Statuses in sheet {shard} were edited, reconciling")
+            return self._reconcile(sheet_id, shard, sheet)
+
+        if self._full_due(shard):
+            return self._reconcile(sheet_id, shard, sheet)
+
+        new_rows = list(enumerate(tail, start=first))[1 if last_row else 0:]
+        if new_rows:
+            added = self.store.add_sheet_rows(sheet_id, shard, new_rows)
+            if added:
+                self.added_rows += added
+                logger.info(f"Added {added} rows entered by hand in sheet {shard}")
+
+    def _statuses_changed(self, shard, status_column):
+        """Compare the sheet's status column with the statuses of mirrored rows in the store"""
+        for row_number, status in self.store.mirrored_statuses(shard):
+            cells = status_column[row_number - 1] if row_number <= len(status_column) else []
+            if (cells[0] if cells else '') != status:
+                return True
+        return False
+
+    def _reconcile(self, sheet_id, shard, sheet):
+        values = sheet.get_all_values()
+        added, updated, removed, kept = self.store.reconcile_rows(sheet_id, shard, values, self.max_removed_share)
+        self.store.set_sheet_header(shard, _header(values[0]) if values else [])
+        self._full_synced_at[shard] = time.monotonic()
+        self.full_syncs += 1
+        self.added_rows += added
+        self.updated_rows += updated
+        self.removed_rows += removed
+        logger.info(f"Reconciled sheet {shard}: {added} rows added, {updated} updated, {removed} removed")
+        if kept:
+            logger.warning(f"{kept} registrations are missing from sheet {shard}, kept them in the store")
+            if self.alert:
+                self.alert(
+                    f"⚠️ В листе {shard} нет {kept} регистраций из базы. Они не удалены из базы: "
+                    f"похоже, таблица была очищена или перезаписана. Проверьте таблицу."
+                )
+
+    def stats(self):
+        now = time.monotonic()
+        sheet_id = self.get_sheet_id()
+        synced_at = self._synced_at.get(sheet_id)
+        return {
+            'last_sync_age': now - synced_at if synced_at else None,
+            'added_rows': self.added_rows,
+            'updated_rows': self.updated_rows,
+            'removed_rows': self.removed_rows,
+            'full_syncs': self.full_syncs,
+            'skipped_syncs': self.skipped_syncs,
+            'failed': self.failed_syncs,
+        }
@@ -0,0 +1,213 @@
+import contextlib
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from metrics import SHEETS_BUDGET_WAIT, SHEETS_RETRIES
+from outbound_limiter import PRIORITY_BULK, PRIORITY_NAMES, PRIORITY_NORMAL
+
+logger = logging.getLogger(__name__)
+
+# Everything else a worksheet does is a read
+WRITE_METHODS = {
+    'append_row', 'append_rows', 'update', 'update_cell', 'update_cells', 'update_acell',
+    'batch_update', 'insert_row', 'insert_rows', 'delete_rows', 'clear', 'batch_clear', 'format',
+}
+# gspread methods that send more than one request
+REQUEST_COST = {'insert_row': 2, 'insert_rows': 2}
+# A failed append may still have reached the sheet, only a 429 is safe to repeat
+NOT_IDEMPOTENT = {'append_row', 'append_rows', 'insert_row', 'insert_rows'}
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class QuotaExhausted(Exception):
+    """No request budget became available in time"""
+
+
+def _error_status(error):
+    """HTTP status of a failed Google API call, 0 for connection errors, None if not retryable"""
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        return status if status in RETRY_STATUS else None
+    import requests
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+        return 0
+    return None
+
+
+class QuotaBudget:
+    """Request budget shared by every Google Sheets call.
+
+    Reads and writes are counted per minute against Google's per-user quotas.
+    A request waits until the window has room; bulk requests (admin lists,
+    audits) may only use the quota minus a reserve, and wait while a more
+    urgent request is waiting, so they are deferred before user data is.
+    429, 5xx and connection errors are retried with exponential backoff and
+    jitter; a 429 also pauses every request of that kind for the delay.
+
+    Priority is set per thread: with budget.priority(PRIORITY_BULK): ...
+    """
+
+    def __init__(self, read_quota=None, write_quota=None, window=60.0, reserve=None,
+                 max_retries=None, base_delay=None, max_delay=None, max_wait=None):
+        self.quotas = {
+            'read': read_quota or int(os.getenv('SHEETS_READ_QUOTA', '60')),
+            'write': write_quota or int(os.getenv('SHEETS_WRITE_QUOTA', '60')),
+        }
+        self.window = window
+        # Share of the quota bulk requests leave to the others
+        self.reserve = reserve if reserve is not None else float(os.getenv('SHEETS_BULK_RESERVE', '0.3'))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('SHEETS_MAX_RETRIES', '5'))
+        self.base_delay = base_delay or float(os.getenv('SHEETS_BACKOFF_BASE', '1'))
+        self.max_delay = max_delay or float(os.getenv('SHEETS_BACKOFF_MAX', '32'))
+        self.max_wait = max_wait or float(os.getenv('SHEETS_BUDGET_MAX_WAIT', '30'))
+
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._sent = {kind: deque() for kind in self.quotas}  # send times, one entry per request
+        self._waiting = {kind: {priority: 0 for priority in PRIORITY_NAMES} for kind in self.quotas}
+        self._paused_until = {kind: 0.0 for kind in self.quotas}
+        self.counters = {kind: {'requests': 0, 'deferred': 0, 'throttled': 0, 'retries': 0, 'failed': 0}
+                         for kind in self.quotas}
+
+    @contextlib.contextmanager
+    def priority(self, priority):
+        """Run the calls made by this thread inside the block with the given priority"""
+        previous = getattr(self._local, 'priority', PRIORITY_NORMAL)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def current_priority(self):
+        return getattr(self._local, 'priority', PRIORITY_NORMAL)
+
+    def call(self, kind, func, *args, cost=1, idempotent=True, **kwargs):
+        """Run one Google API call within the budget, retrying quota and server errors"""
+        priority = self.current_priority()
+        for attempt in range(self.max_retries + 1):
+            self.acquire(kind, priority, cost)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                status = _error_status(e)
+                retryable = status is not None and (idempotent or status == 429)
+                if not retryable or attempt == self.max_retries:
+                    if status is not None:
+                        with self._cond:
+                            self.counters[kind]['failed'] += 1
+                    raise
+                delay = self._backoff(attempt)
+                reason = str(status) if status else 'connection'
+                with self._cond:
+                    self.counters[kind]['retries'] += 1
+                    if status == 429:
+                        self.counters[kind]['throttled'] += 1
+                        # Everyone sending this kind of request would get the same answer
+                        self._paused_until[kind] = max(self._paused_until[kind], time.monotonic() + delay)
+                SHEETS_RETRIES.inc(kind, reason)
+                logger.warning(f"Sheets {kind} request failed ({reason}), retry {attempt + 1} in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    def _backoff(self, attempt):
+        # Half fixed, half random, so retries of parallel callers spread out
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def acquire(self, kind, priority, cost=1):
+        """Block until the window has room for cost requests of this priority"""
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        with self._cond:
+            waited = False
+            self._waiting[kind][priority] += 1
+            try:
+                while True:
+                    delay = self._delay(kind, priority, cost)
+                    if delay <= 0:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise QuotaExhausted(f"No Sheets {kind} budget for {self.max_wait:.0f}s")
+                    waited = True
+                    self._cond.wait(min(delay, remaining))
+            finally:
+                self._waiting[kind][priority] -= 1
+                # Lower priorities may be waiting on this one
+                self._cond.notify_all()
+
+            now = time.monotonic()
+            self._sent[kind].extend([now] * cost)
+            self.counters[kind]['requests'] += cost
+            if waited:
+                self.counters[kind]['deferred'] += 1
+        SHEETS_BUDGET_WAIT.observe(time.monotonic() - started, kind, PRIORITY_NAMES[priority])
+
+    def _delay(self, kind, priority, cost):
+        """Seconds until the request may be sent, called with the lock held"""
+        now = time.monotonic()
+        sent = self._sent[kind]
+        while sent and sent[0] <= now - self.window:
+            sent.popleft()
+
+        pause = self._paused_until[kind] - now
+        if pause > 0:
+            return pause
+        if any(count for other, count in self._waiting[kind].items() if other < priority):
+            # Woken up by notify_all when the more urgent request is sent
+            return self.window
+        limit = self.quotas[kind]
+        if priority >= PRIORITY_BULK:
+            limit = max(1, int(limit * (1 - self.reserve)))
+        if len(sent) + cost <= limit or not sent:
+            return 0
+        # Room frees up when the oldest requests leave the window
+        index = min(len(sent) + cost - limit, len(sent)) - 1
+        return sent[index] + self.window - now
+
+    def used(self, kind):
+        """Requests sent in the current window"""
+        with self._cond:
+            now = time.monotonic()
+            return sum(1 for sent in self._sent[kind] if sent > now - self.window)
+
+    def stats(self):
+        result = {}
+        for kind, quota in self.quotas.items():
+            used = self.used(kind)
+            with self._cond:
+                result[kind] = {
+                    'used': used,
+                    'quota': quota,
+                    'waiting': sum(self._waiting[kind].values()),
+                    'paused_for': max(self._paused_until[kind] - time.monotonic(), 0.0),
+                    **self.counters[kind],
+                }
+        return result
+
+
+class BudgetedWorksheet:
+    """Worksheet proxy sending every call through a QuotaBudget"""
+
+    def __init__(self, worksheet, budget):
+        self._worksheet = worksheet
+        self._budget = budget
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if not callable(attr):
+            return attr
+
+        kind = 'write' if name in WRITE_METHODS else 'read'
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return self._budget.call(
+                kind, attr, *args, cost=REQUEST_COST.get(name, 1), idempotent=name not in NOT_IDEMPOTENT, **kwargs
+            )
+        return call
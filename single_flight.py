@@ -0,0 +1,139 @@
+import functools
+import os
+import threading
+import time
+
+from sheets_budget import WRITE_METHODS
+
+# Worksheet reads that download a whole sheet, column or row
+SHARED_METHODS = {'get_all_values', 'get_all_records', 'get_values', 'col_values', 'row_values'}
+
+
+class _Flight:
+    def __init__(self, generation):
+        self.generation = generation
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution and its result.
+
+    The result is then reused for fresh_for seconds. Keys are tuples whose
+    first item is a group (the sheet ID); forget(group) drops the group's
+    results and detaches its running calls, so nothing read before a write
+    is handed out after it. Results are shared, callers must not modify them.
+    Callers joining a running call wait for it at most timeout seconds.
+    """
+
+    def __init__(self, fresh_for=None, timeout=None):
+        self.fresh_for = fresh_for if fresh_for is not None else float(os.getenv('SHEETS_READ_FRESHNESS', '2'))
+        self.timeout = timeout or float(os.getenv('STORAGE_TIMEOUT', '30'))
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> _Flight
+        self._results = {}  # key -> (expires at, result)
+        self._generations = {}  # group -> number of forget() calls
+        self.calls = 0
+        self.shared = 0
+        self.fresh_hits = 0
+
+    def do(self, key, func, *args, **kwargs):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._results.get(key)
+            if cached and cached[0] > now:
+                self.fresh_hits += 1
+                return cached[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(self._generations.get(key[0], 0))
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            if not flight.done.wait(self.timeout):
+                raise TimeoutError(f"Shared call {key[1]} did not finish in {self.timeout:.0f}s")
+            if flight.error:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func(*args, **kwargs)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                current = flight.generation == self._generations.get(key[0], 0)
+                if flight.error is None and current and self.fresh_for:
+                    self._results[key] = (time.monotonic() + self.fresh_for, flight.result)
+            flight.done.set()
+        return flight.result
+
+    def forget(self, group):
+        """Drop results of a group and let the next call start over"""
+        with self._lock:
+            self._generations[group] = self._generations.get(group, 0) + 1
+            for key in [key for key in self._results if key[0] == group]:
+                del self._results[key]
+            for key in [key for key in self._flights if key[0] == group]:
+                del self._flights[key]
+
+    def forget_all(self):
+        with self._lock:
+            for group in {key[0] for key in list(self._results) + list(self._flights)}:
+                self._generations[group] = self._generations.get(group, 0) + 1
+            self._results.clear()
+            self._flights.clear()
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            self._results = {key: value for key, value in self._results.items() if value[0] > now}
+            return {
+                'calls': self.calls,
+                'shared': self.shared,
+                'fresh_hits': self.fresh_hits,
+                'cached': len(self._results),
+            }
+
+
+class SharedReadsWorksheet:
+    """Worksheet proxy coalescing identical whole-sheet reads, writes forget the sheet's results"""
+
+    def __init__(self, worksheet, flights, sheet_id):
+        self._worksheet = worksheet
+        self._flights = flights
+        self._sheet_id = sheet_id
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if not callable(attr):
+            return attr
+
+        if name in SHARED_METHODS:
+            @functools.wraps(attr)
+            def read(*args, **kwargs):
+                key = (self._sheet_id, name, args, tuple(sorted(kwargs.items())))
+                try:
+                    hash(key)
+                except TypeError:
+                    return attr(*args, **kwargs)
+                return self._flights.do(key, attr, *args, **kwargs)
+            return read
+        if name not in WRITE_METHODS:
+            return attr
+
+        @functools.wraps(attr)
+        def write(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                # Whatever was read before may be outdated now, even if the call failed halfway
+                self._flights.forget(self._sheet_id)
+        return write
@@ -0,0 +1,26 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Records when each startup phase finished, counted from process start"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}  # phase -> (seconds since start, own duration or None)
+
+    def mark(self, phase, duration=None):
+        """Record phase end; duration is for phases that ran in parallel (background auth)"""
+        elapsed = time.perf_counter() - self.started
+        self.phases[phase] = (elapsed, duration)
+        took = f" (took {duration:.3f}s)" if duration is not None else ""
+        logger.info(f"Startup: {phase} at {elapsed:.3f}s{took}")
+
+    def report(self):
+        return ", ".join(f"{phase}={elapsed:.3f}s" for phase, (elapsed, _) in self.phases.items())
+
+
+# Created on first import, so main.py imports it before anything heavy
+STARTUP = StartupTimer()
@@ -0,0 +1,49 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class StoragePool:
+    """Bounded worker pool for blocking storage calls (gspread, requests, pandas)"""
+
+    def __init__(self, max_workers=None, max_pending=None, timeout=None):
+        self.max_workers = max_workers or int(os.getenv('STORAGE_WORKERS', '4'))
+        self.max_pending = max_pending or int(os.getenv('STORAGE_MAX_PENDING', '100'))
+        self.timeout = timeout or float(os.getenv('STORAGE_TIMEOUT', '30'))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='storage')
+        self._slots = None
+
+    async def run(self, func, *args, timeout=None):
+        """Run blocking function in the pool, raise asyncio.TimeoutError if it takes too long"""
+        loop = asyncio.get_running_loop()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+
+        # Bound the number of queued calls, not only the running ones
+        await self._slots.acquire()
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # Free the slot when the worker is actually done, even if we stopped waiting
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._slots.release))
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            # Cancels the call if it has not started yet; a running call finishes in background,
+            # Google clients time out their requests after the same time
+            future.cancel()
+            logger.error(f"Storage call {getattr(func, '__name__', func)} timed out")
+            raise
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    def shutdown(self):
+        """Stop accepting work and drop queued calls"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,58 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from registration_store import RegistrationStore
+from shard_router import ShardRouter, has_room, shard_name
+
+SHEET_ID = 'sheet'
+
+
+def wallet(n):
+    return f'0x{n:040x}'
+
+
+def register(store, router, n):
+    shard = router.route(SHEET_ID, wallet(n))
+    if store.add_registration(SHEET_ID, {
+        'Телеграмм ID': str(1000 + n), 'Имя пользователя': f'user{n}', 'Пользовательский кошелек': wallet(n),
+        'Кошелек реферера': '', 'Статус': '',
+    }, shard):
+        router.record(shard)
+    return shard
+
+
+def test_route_is_stable_and_counts_only_stored_rows(tmp_path):
+    store = RegistrationStore(str(tmp_path / 'registrations.db'))
+    store.import_rows(SHEET_ID, [[]])
+    store.add_shard(SHEET_ID, shard_name(SHEET_ID, 'Регистрации 2'))
+    router = ShardRouter(store, max_rows=1000, count_ttl=3600)
+
+    shards = [register(store, router, n) for n in range(40)]
+    # The same wallet again is rejected and must not count
+    register(store, router, 0)
+
+    assert set(shards) == set(store.shards(SHEET_ID))
+    assert [router.route(SHEET_ID, wallet(n)) for n in range(40)] == shards
+    for shard in store.shards(SHEET_ID):
+        assert router.size(shard) == store.shard_size(shard)
+
+
+def test_full_shards_ask_for_more(tmp_path):
+    store = RegistrationStore(str(tmp_path / 'registrations.db'))
+    store.import_rows(SHEET_ID, [[]])
+    full = []
+    router = ShardRouter(store, max_rows=2, count_ttl=0, on_full=full.append)
+
+    for n in range(3):
+        assert register(store, router, n) == SHEET_ID
+
+    assert full == [SHEET_ID]
+
+
+def test_has_room_counts_grid_cells():
+    # A default 26-column first worksheet with 200k rows is already 5.2M cells
+    assert has_room([(200_000, 26)], 200_000, 5)
+    assert not has_room([(200_000, 26), (200_000, 5), (200_000, 5), (200_000, 5)], 200_000, 26)
+    assert not has_room([(300_000, 26)], 200_000, 26)
@@ -0,0 +1,115 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from fake_sheets import FakeClient
+from registration_store import RegistrationStore
+from sheet_mirror import SHEET_HEADERS, SheetReplicator
+from sheet_sync import SheetTailSync
+from sheets_budget import QuotaBudget
+
+SHEET_ID = 'sheet'
+
+
+def wallet(n):
+    return f'0x{n:040x}'
+
+
+@pytest.fixture
+def env(tmp_path):
+    client = FakeClient()
+    sheet = client.worksheet(SHEET_ID)
+    sheet.rows = [list(SHEET_HEADERS)] + [[str(1000 + n), f'user{n}', wallet(n), '', ''] for n in range(1, 4)]
+    store = RegistrationStore(str(tmp_path / 'registrations.db'))
+    store.import_rows(SHEET_ID, sheet.get_all_values())
+    replicator = SheetReplicator(store, client.worksheet)
+    alerts = []
+    sync = SheetTailSync(store, client.worksheet, lambda: SHEET_ID, replicator, QuotaBudget(), interval=0,
+                         alert=alerts.append,
+                         get_version=lambda key: client.get_file_drive_metadata(key)['modifiedTime'])
+    sync.alerts = alerts
+    return sheet, store, sync
+
+
+def test_extra_column_keeps_sync_incremental(env):
+    sheet, store, sync = env
+    sheet.rows[0].append('Заметки')
+    sheet.rows[2].extend(['', 'wider than the header'])
+    # The reconcile stores the header the next syncs compare against
+    sheet.rows[3][4] = 'Валидирован'
+
+    assert sync.sync(SHEET_ID)
+    assert sync.full_syncs == 1
+    assert sync.sync(SHEET_ID)
+    sheet.rows.append(['1004', 'user4', wallet(4), '', ''])
+    assert sync.sync(SHEET_ID)
+
+    assert sync.full_syncs == 1
+    assert sync.added_rows == 1
+
+
+def test_status_edited_in_place_is_picked_up(env):
+    sheet, store, sync = env
+    sheet.rows[1][4] = 'Валидирован'
+
+    assert sync.sync(SHEET_ID)
+
+    assert '1001' not in [telegram_id for telegram_id, _, _ in store.pending_users(SHEET_ID)]
+    assert sync.full_syncs == 1
+    assert sync.sync(SHEET_ID)
+    assert sync.full_syncs == 1
+
+
+def test_unchanged_sheet_is_not_read(env):
+    sheet, store, sync = env
+    assert sync.sync(SHEET_ID)
+    reads = dict(sheet.calls)
+
+    assert sync.sync(SHEET_ID)
+
+    assert sheet.calls == reads
+    assert sync.skipped_syncs == 1
+
+
+def test_rows_deleted_by_hand_are_removed(env):
+    sheet, store, sync = env
+    store.add_registration(SHEET_ID, {
+        'Телеграмм ID': '1005', 'Имя пользователя': 'user5', 'Пользовательский кошелек': wallet(5),
+        'Кошелек реферера': '', 'Статус': '',
+    })
+    del sheet.rows[2]
+
+    store.reconcile_rows(SHEET_ID, SHEET_ID, sheet.get_all_values())
+
+    pending = [telegram_id for telegram_id, _, _ in store.pending_users(SHEET_ID)]
+    assert pending == ['1001', '1003', '1005']
+    assert not store.wallet_exists(SHEET_ID, wallet(2))
+
+
+def test_cleared_sheet_keeps_rows(env):
+    sheet, store, sync = env
+    sheet.rows = []
+
+    assert sync.sync(SHEET_ID)
+
+    assert sync.full_syncs == 1
+    assert sync.removed_rows == 0
+    assert len(store.pending_users(SHEET_ID)) == 3
+    assert len(sync.alerts) == 1
+
+
+def test_mass_removal_keeps_rows(env):
+    sheet, store, sync = env
+    sheet.rows += [[str(1000 + n), f'user{n}', wallet(n), '', ''] for n in range(4, 50)]
+    store.reconcile_rows(SHEET_ID, SHEET_ID, sheet.get_all_values())
+    del sheet.rows[1:41]
+
+    added, updated, removed, kept = store.reconcile_rows(SHEET_ID, SHEET_ID, sheet.get_all_values(), 0.1)
+
+    assert (removed, kept) == (0, 40)
+    assert len(store.pending_users(SHEET_ID)) == 49
@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from registration_store import RegistrationStore
+from user_pages import BACK, FORWARD, UserListPages
+
+SHEET_ID = 'sheet'
+
+
+def test_pages_follow_the_cursor(tmp_path):
+    store = RegistrationStore(str(tmp_path / 'registrations.db'))
+    store.import_rows(SHEET_ID, [[str(1000 + n), f'user{n}', f'0x{n:040x}', '', ''] for n in range(45)])
+    pages = UserListPages(page_size=20)
+
+    first, has_earlier, has_later = store.pending_page(SHEET_ID, 20)
+    assert [user[1] for user in first] == [str(1000 + n) for n in range(20)]
+    assert (has_earlier, has_later) == (False, True)
+
+    text, markup = pages.render(first, 0, store.pending_count(SHEET_ID), has_earlier, has_later)
+    assert 'стр. 1/3' in text
+    direction, cursor, page = pages.parse(markup.inline_keyboard[0][0].callback_data)
+    assert (direction, page) == (FORWARD, 1)
+
+    # Users validated meanwhile do not shift the next page
+    store.update_status(SHEET_ID, 1005, 'Подтвержден')
+    second, has_earlier, has_later = store.pending_page(SHEET_ID, 20, after_id=cursor)
+    assert second[0][1] == '1020'
+    assert (has_earlier, has_later) == (True, True)
+
+    text, markup = pages.render(second, page, store.pending_count(SHEET_ID), has_earlier, has_later)
+    direction, cursor, page = pages.parse(markup.inline_keyboard[0][0].callback_data)
+    assert (direction, page) == (BACK, 0)
+    back, has_earlier, _ = store.pending_page(SHEET_ID, 20, before_id=cursor)
+    assert [user[1] for user in back] == [str(1000 + n) for n in range(20) if n != 5][-20:]
+    assert not has_earlier
@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wallet_audit
+from sheet_mirror import SHEET_HEADERS
+
+WALLET = '0x' + 'ab' * 20
+
+
+def test_blank_rows_are_skipped():
+    assert wallet_audit.audit_rows([[]])['malformed'] == []
+
+    report = wallet_audit.audit_rows([
+        SHEET_HEADERS,
+        ['1', 'user1', WALLET, WALLET.replace('ab', 'cd', 1), ''],
+        ['', '', '', '', ''],
+        ['2', 'user2', 'broken', WALLET, ''],
+        [' ', ''],
+    ])
+
+    assert report['rows'] == 2
+    assert report['malformed'] == [(4, wallet_audit.WALLET_COLUMN, 'broken')]
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import os
+import sys
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Handles updates of different users concurrently, updates of one user strictly in order.
+
+    ConversationHandler keeps state per user, so two messages of the same user
+    must not run at the same time. Locks are created on demand and dropped when
+    nobody waits on them.
+    """
+
+    def __init__(self, max_concurrent_updates=None):
+        self.limit = max_concurrent_updates or int(os.getenv('UPDATE_CONCURRENCY', '32'))
+        # The base class semaphore is taken before do_process_update and does not keep
+        # arrival order, so it is left unbounded and the limit is applied after the user lock
+        super().__init__(sys.maxsize)
+        self._slots = asyncio.BoundedSemaphore(self.limit)
+        self._locks = {}  # user or chat id -> [lock, number of updates holding or waiting]
+
+    async def do_process_update(self, update, coroutine):
+        key = self._key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            # Updates reach this point in the order they were fetched and asyncio.Lock is FIFO
+            async with entry[0], self._slots:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    def _key(self, update):
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._locks:
+            logger.info(f"Update processor stopped with {len(self._locks)} users still in progress")
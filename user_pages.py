@@ -0,0 +1,54 @@
+import os
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+CALLBACK_PREFIX = 'users'
+# Page buttons carry the direction, the id of the first or last registration shown and the page number
+FORWARD = 'n'
+BACK = 'p'
+
+
+class UserListPages:
+    """Pages of pending users, read from the store with a keyset cursor kept in the buttons"""
+
+    def __init__(self, page_size=None):
+        self.page_size = page_size or int(os.getenv('ADMIN_PAGE_SIZE', '20'))
+
+    def parse(self, data):
+        """(direction, registration id, page) of a page button, ValueError if it is not one"""
+        prefix, direction, cursor, page = data.split(':')
+        if prefix != CALLBACK_PREFIX or direction not in (FORWARD, BACK):
+            raise ValueError(data)
+        return direction, int(cursor), int(page)
+
+    def render(self, users, page, total, has_earlier, has_later):
+        """Text and inline keyboard for one page of (registration id, telegram id, username, wallet)"""
+        pages = max((total + self.page_size - 1) // self.page_size, 1)
+        # The total may have changed since the list was opened
+        page = max(page, 0)
+        pages = max(pages, page + 1)
+
+        lines = [
+            f"ID: {telegram_id}, Username: {username}, Кошелек: {wallet}"
+            for _, telegram_id, username, wallet in users
+        ]
+        text = (
+            f"Список пользователей для валидации ({total}), "
+            f"стр. {page + 1}/{pages}:\n" + "\n".join(lines)
+        )
+        if len(text) > MAX_MESSAGE_LENGTH:
+            text = text[:MAX_MESSAGE_LENGTH - 1] + '…'
+
+        buttons = []
+        if has_earlier:
+            buttons.append(InlineKeyboardButton(
+                '◀️', callback_data=f'{CALLBACK_PREFIX}:{BACK}:{users[0][0]}:{max(page - 1, 0)}'
+            ))
+        if has_later:
+            buttons.append(InlineKeyboardButton(
+                '▶️', callback_data=f'{CALLBACK_PREFIX}:{FORWARD}:{users[-1][0]}:{page + 1}'
+            ))
+        markup = InlineKeyboardMarkup([buttons]) if buttons else None
+        return text, markup
@@ -0,0 +1,183 @@
+import logging
+import re
+from functools import lru_cache
+
+from sheet_mirror import SHEET_HEADERS
+
+logger = logging.getLogger(__name__)
+
+ADDRESS_PATTERN = r'0x[0-9a-fA-F]{40}'
+ADDRESS_RE = re.compile(f'^{ADDRESS_PATTERN}$')
+
+ID_COLUMN, USERNAME_COLUMN, WALLET_COLUMN, REFERRER_COLUMN = SHEET_HEADERS[:4]
+
+_keccak = None
+
+
+def keccak_hex(data):
+    """Keccak-256 of bytes as hex, None if no keccak implementation is installed.
+    hashlib.sha3_256 is the final SHA-3 and gives different digests"""
+    global _keccak
+    if _keccak is None:
+        try:
+            from Crypto.Hash import keccak
+            _keccak = lambda value: keccak.new(digest_bits=256, data=value).hexdigest()
+        except ImportError:
+            try:
+                from eth_hash.auto import keccak as eth_keccak
+                _keccak = lambda value: eth_keccak(value).hex()
+            except ImportError:
+                logger.warning("pycryptodome is not installed, EIP-55 checksums are not checked")
+                _keccak = False
+    return _keccak(data) if _keccak else None
+
+
+@lru_cache(maxsize=262144)
+def to_checksum_address(address):
+    """EIP-55 mixed-case form of a 0x address, None without keccak"""
+    hex_part = address[2:].lower()
+    digest = keccak_hex(hex_part.encode())
+    if digest is None:
+        return None
+    return '0x' + ''.join(
+        char.upper() if char.isalpha() and int(digest[i], 16) >= 8 else char
+        for i, char in enumerate(hex_part)
+    )
+
+
+def has_valid_checksum(address):
+    """All-lowercase and all-uppercase addresses carry no checksum and pass"""
+    hex_part = address[2:]
+    if hex_part == hex_part.lower() or hex_part == hex_part.upper():
+        return True
+    expected = to_checksum_address(address.lower())
+    return expected is None or expected == address
+
+
+def audit_rows(values):
+    """Check every row of the sheet (as returned by get_all_values).
+
+    Returns dict with row counts and lists of problems; row numbers are the
+    sheet's own (1-based, header included).
+    """
+    return _audit(_frame(values))
+
+
+def audit_shards(tables):
+    """Check the rows of all shards together, tables is [(shard number, values)].
+
+    Duplicates are found across shards; rows are (shard number, row number).
+    """
+    import pandas as pd
+
+    frames = []
+    for number, values in tables:
+        df = _frame(values)
+        df.index = pd.MultiIndex.from_arrays([[number] * len(df), df.index])
+        frames.append(df)
+    return _audit(pd.concat(frames) if frames else _frame([]))
+
+
+def _frame(values):
+    """Bot columns of the rows, stripped, indexed by sheet row number; blank rows are left out"""
+    import pandas as pd
+
+    header = values[0] if values else []
+    has_header = WALLET_COLUMN in header
+    rows = values[1:] if has_header else values
+    first_row = 2 if has_header else 1
+
+    # Columns by header name when there is one, otherwise in the bot's order
+    positions = [header.index(name) if has_header and name in header else i for i, name in enumerate(SHEET_HEADERS[:4])]
+    width = max(positions) + 1
+    # gspread returns [[]] for an empty sheet, and editors leave trailing blank rows
+    numbered = [(number, row) for number, row in enumerate(rows, start=first_row) if any(str(cell).strip() for cell in row)]
+    df = pd.DataFrame(
+        [list(row[:width]) + [''] * (width - len(row)) for _, row in numbered],
+        columns=range(width), dtype=object,
+    )
+    df = df[positions].astype(str).apply(lambda column: column.str.strip())
+    df.columns = [ID_COLUMN, USERNAME_COLUMN, WALLET_COLUMN, REFERRER_COLUMN]
+    df.index = [number for number, _ in numbered]
+    return df
+
+
+def _audit(df):
+    report = {
+        'rows': len(df),
+        'checksum_checked': keccak_hex(b'') is not None,
+        'malformed': [],
+        'bad_checksum': [],
+        'case_duplicates': [],
+        'exact_duplicates': [],
+        'self_referrals': [],
+    }
+    if df.empty:
+        return report
+
+    valid = {}
+    for column in (WALLET_COLUMN, REFERRER_COLUMN):
+        addresses = df[column]
+        valid[column] = addresses.str.fullmatch(ADDRESS_PATTERN).fillna(False).astype(bool)
+        report['malformed'] += [(row, column, value) for row, value in addresses[~valid[column]].items()]
+
+        # Only mixed-case addresses carry a checksum, hashing is memoized per address
+        hex_part = addresses.str[2:]
+        mixed = valid[column] & hex_part.str.contains('[a-f]') & hex_part.str.contains('[A-F]')
+        candidates = addresses[mixed]
+        if report['checksum_checked'] and not candidates.empty:
+            ok = candidates.map(has_valid_checksum).astype(bool)
+            report['bad_checksum'] += [(row, column, value) for row, value in candidates[~ok].items()]
+    report['malformed'].sort()
+    report['bad_checksum'].sort()
+
+    wallets = df.loc[valid[WALLET_COLUMN], WALLET_COLUMN]
+    lowered = wallets.str.lower()
+    repeated = lowered.duplicated(keep=False)
+    if repeated.any():
+        groups = wallets[repeated].groupby(lowered[repeated], sort=False)
+        for wallet, group in groups:
+            entry = (wallet, list(group.index))
+            if group.nunique() > 1:
+                report['case_duplicates'].append(entry)
+            else:
+                report['exact_duplicates'].append(entry)
+
+    both = valid[WALLET_COLUMN] & valid[REFERRER_COLUMN]
+    self_referral = both & (df[WALLET_COLUMN].str.lower() == df[REFERRER_COLUMN].str.lower())
+    report['self_referrals'] = list(df.loc[self_referral, WALLET_COLUMN].items())
+    return report
+
+
+def _row(position):
+    """Row number, or the row and its shard for reports of several shards"""
+    if isinstance(position, tuple):
+        return f"{position[1]} (лист {position[0]})"
+    return str(position)
+
+
+def format_report(report, limit=10):
+    """Admin-facing summary with at most `limit` examples per problem"""
+    lines = [f"🔍 Проверено строк: {report['rows']}"]
+    if not report['checksum_checked']:
+        lines.append("⚠️ Контрольная сумма EIP-55 не проверялась (нет pycryptodome)")
+
+    def section(title, items, render):
+        lines.append("")
+        lines.append(f"{title}: {len(items)}")
+        for item in items[:limit]:
+            lines.append(render(item))
+        if len(items) > limit:
+            lines.append(f"... и еще {len(items) - limit}")
+
+    section("❌ Неверный формат адреса", report['malformed'],
+            lambda item: f"строка {_row(item[0])}, {item[1]}: {item[2] or '(пусто)'}")
+    section("❌ Неверная контрольная сумма", report['bad_checksum'],
+            lambda item: f"строка {_row(item[0])}, {item[1]}: {item[2]}")
+    section("⚠️ Дубликаты, отличающиеся регистром", report['case_duplicates'],
+            lambda item: f"{item[0]}: строки {', '.join(map(_row, item[1]))}")
+    section("⚠️ Полные дубликаты", report['exact_duplicates'],
+            lambda item: f"{item[0]}: строки {', '.join(map(_row, item[1]))}")
+    section("⚠️ Реферер совпадает с кошельком", report['self_referrals'],
+            lambda item: f"строка {_row(item[0])}: {item[1]}")
+    return "\n".join(lines)
@@ -0,0 +1,53 @@
+from io import BytesIO
+
+from openpyxl import Workbook, load_workbook
+
+WALLET_HEADER = 'Пользовательский кошелек'
+
+
+def iter_column(file, header):
+    """Yield values of the column with the given header, streaming rows in read-only mode"""
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header_row = next(rows, None)
+        if not header_row or header not in header_row:
+            return
+        idx = header_row.index(header)
+        for row in rows:
+            if len(row) > idx:
+                yield row[idx]
+    finally:
+        workbook.close()
+
+
+def read_rows(file):
+    """All rows of the active sheet as lists of strings, header included"""
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        return [
+            ['' if value is None else str(value) for value in row]
+            for row in workbook.active.iter_rows(values_only=True)
+        ]
+    finally:
+        workbook.close()
+
+
+def wallet_exists(file, wallet):
+    """Case-insensitive wallet lookup that stops at the first match"""
+    target = wallet.lower()
+    for value in iter_column(file, WALLET_HEADER):
+        if value and str(value).lower() == target:
+            return True
+    return False
+
+
+def empty_workbook(headers):
+    """In-memory workbook with only a header row"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(headers)
+    buffer = BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer